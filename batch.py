@@ -0,0 +1,146 @@
+from array import array
+from itertools import chain
+
+import numpy as np # (only imported for `get_movies.py --batch`)
+
+from showtimes import Showtimes, NO_TIME
+from timing import timed
+from utils import get_cutoff
+
+
+class ShowtimesBatch:
+    """Showtimes for a whole run (all theaters & dates), as flat arrays -- one row per showtime"""
+
+    def __init__(self, listings):
+        """
+        :listings: list of (date str (yyyy-mm-dd) or None, Showtimes, dict {title: float} or None)
+        """
+        dates, self.listings, ds_ratings = zip(*listings) if listings else ((), (), ())
+
+        sizes = np.fromiter(map(len, self.listings), dtype=np.int64, count=len(self.listings))
+        self.offsets = np.concatenate(([0], np.cumsum(sizes)))[:-1]
+        self.listing_ids = np.repeat(np.arange(len(self.listings)), sizes)
+        n = int(sizes.sum())
+
+        def to_ids(strs):
+            """strs -> (np.array of ids, dict {str: id})"""
+            d_ids = {s: i for i, s in enumerate(dict.fromkeys(strs))}
+            return np.fromiter(map(d_ids.__getitem__, strs), dtype=np.int64, count=n), d_ids
+
+        def to_names(d_ids):
+            """dict {str: id} -> np.array of (the same) strs, by id"""
+            names = np.empty(len(d_ids), dtype=object)
+            names[:] = list(d_ids)
+            return names
+
+        self.title_ids, d_titles = to_ids(list(chain.from_iterable(
+            showtimes.titles for showtimes in self.listings)))
+        self.format_ids, d_formats = to_ids(list(chain.from_iterable(
+            showtimes.formats for showtimes in self.listings)))
+        self.n_titles, self.n_formats = len(d_titles), len(d_formats)
+        self.titles, self.formats = to_names(d_titles), to_names(d_formats)
+
+        concat = lambda arrays, dtype: np.concatenate([np.frombuffer(a, dtype=dtype) for a in arrays]
+                                                      or [np.empty(0, dtype)])
+        self.minutes = concat((showtimes.starts for showtimes in self.listings), np.int16)
+        self.sold_out = concat((showtimes.sold_out for showtimes in self.listings), np.int8)
+
+        # start = date + minute of day (NaT if no date or time)
+        days = np.repeat(np.array([date or 'NaT' for date in dates], dtype='datetime64[D]'), sizes)
+        self.starts = np.where(self.minutes == NO_TIME, np.datetime64('NaT'),
+                               days + self.minutes.astype('timedelta64[m]'))
+
+        # rating per title (or -1 if not found)
+        title_ratings = np.full(self.n_titles, -1.)
+        for d_ratings in filter(None, ds_ratings):
+            for title, rating in d_ratings.items():
+                if title in d_titles:
+                    title_ratings[d_titles[title]] = rating
+        self.ratings = title_ratings[self.title_ids]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def is_past(self, cutoff=None):
+        """
+        :cutoff: datetime str (default: run cutoff, else now)
+        :returns: np.array of bools
+        """
+        return self.starts < np.datetime64(get_cutoff(cutoff), 'm') # (NaT is never past)
+
+    def is_below(self, threshold=0):
+        """
+        :threshold: float [0, 1] or % (1, 100]
+        :returns: np.array of bools (False if rating not found)
+        """
+        threshold = threshold / 100 if threshold > 1 else threshold # % -> float
+        return (self.ratings >= 0) & (self.ratings < threshold)
+
+    def keys(self, idxs):
+        """
+        :idxs: np.array of ints
+        :returns: np.array of ints, unique per (theater, title, format)
+        """
+        return ((self.listing_ids[idxs] * self.n_titles + self.title_ids[idxs])
+                * self.n_formats + self.format_ids[idxs])
+
+    def group(self, idxs):
+        """Order rows by (theater, title, format) group, in order of first appearance
+
+        :idxs: np.array of ints (rows to keep)
+        :returns: np.array of ints
+        """
+        _, first, inverse = np.unique(self.keys(idxs), return_index=True, return_inverse=True)
+        return idxs[np.lexsort((idxs, first[inverse]))]
+
+    def split(self, idxs):
+        """Grouped rows -> Showtimes per listing (w/ groups precomputed)
+
+        :idxs: np.array of ints (see `group`)
+        :returns: list of Showtimes
+        """
+        keys = self.keys(idxs)
+        group_starts = np.flatnonzero(np.diff(keys, prepend=-1)) # first row of each group
+
+        bounds = np.searchsorted(self.listing_ids[idxs], np.arange(len(self.listings) + 1)).tolist()
+        group_bounds = np.searchsorted(group_starts, bounds).tolist()
+        group_starts = group_starts.tolist()
+        local_idxs = (idxs - self.offsets[self.listing_ids[idxs]]).tolist() # row -> index into listing
+
+        # columns for all rows kept, sliced per listing below (rather than per-row lookups)
+        titles = self.titles[self.title_ids[idxs]].tolist()
+        formats = self.formats[self.format_ids[idxs]].tolist()
+        minutes, sold_out = self.minutes[idxs], self.sold_out[idxs]
+
+        split = []
+        for i, showtimes in enumerate(self.listings):
+            lo, hi = bounds[i], bounds[i + 1]
+
+            subset = Showtimes() # (column-wise, as `Showtimes.take`)
+            subset.titles = titles[lo:hi]
+            subset.starts = array('h', minutes[lo:hi].tobytes())
+            subset.formats = formats[lo:hi]
+            subset.sold_out = array('b', sold_out[lo:hi].tobytes())
+            subset.labels = ({j: showtimes.labels[k] for j, k in enumerate(local_idxs[lo:hi])
+                              if k in showtimes.labels} if showtimes.labels else {})
+
+            starts = [j - lo for j in group_starts[group_bounds[i]:group_bounds[i + 1]]] + [hi - lo]
+            subset.set_groups({(subset.titles[a], subset.formats[a]): range(a, b)
+                               for a, b in zip(starts, starts[1:])})
+            split.append(subset)
+
+        return split
+
+
+@timed('postprocess')
+def postprocess(listings, threshold=0, cutoff=None):
+    """Filter past showtimes & movies below rating threshold, for all listings at once
+
+    :listings: list of (date str (yyyy-mm-dd) or None, Showtimes, dict {title: float} or None)
+    :threshold: float [0, 1] or % (1, 100]
+    :cutoff: datetime str (default: run cutoff, else now)
+    :returns: list of Showtimes (grouped by title & format)
+    """
+    batch = ShowtimesBatch(listings)
+    keep = ~(batch.is_past(cutoff) | batch.is_below(threshold))
+    return batch.split(batch.group(np.flatnonzero(keep)))
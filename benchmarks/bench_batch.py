@@ -0,0 +1,77 @@
+"""Benchmark batched (NumPy) vs. per-theater post-processing of a run's listings
+
+$ python benchmarks/bench_batch.py [--theaters N] [--days N] [--movies N] [--times N] [--repeat N]
+"""
+import argparse
+from datetime import datetime
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from batch import postprocess
+from showtimes import Showtimes, from_minutes
+from utils import filter_by_rating, get_dates, set_cutoff
+
+
+THRESHOLD = 0.6
+
+
+def get_listings(n_theaters, n_days, n_movies, n_times, seed=0):
+    """Synthetic run: list of (date, Showtimes, dict of ratings)"""
+    rand = random.Random(seed)
+
+    titles = [f'movie #{i}' for i in range(n_movies * 5)]
+    d_ratings = {title: rand.choice((-1, rand.random())) for title in titles}
+    fmts = ['', '', '', '35mm', 'q&a']
+
+    listings = []
+    for date in get_dates(datetime.now().strftime('%Y-%m-%d'), n_days):
+        for _ in range(n_theaters):
+            movie_names = rand.sample(titles, n_movies)
+            movie_times = [[from_minutes(rand.randrange(10 * 60, 24 * 60, 5))
+                            for _ in range(n_times)] + [f'[ {fmt} ]' for fmt in [rand.choice(fmts)] if fmt]
+                           for _ in movie_names]
+            showtimes = Showtimes.from_lists(movie_names, movie_times)
+            listings.append((date, showtimes, {t: d_ratings[t] for t in showtimes.unique_titles()}))
+    return listings
+
+
+def per_theater(listings):
+    """Filter by rating & group, theater by theater (N.B. past showtimes are filtered by scrapers)"""
+    filtered = [filter_by_rating(showtimes, d_ratings, THRESHOLD)
+                for _, showtimes, d_ratings in listings]
+    for showtimes in filtered:
+        showtimes.group()
+    return filtered
+
+
+def batched(listings):
+    """Filter past showtimes & by rating, & group, all at once"""
+    return postprocess(listings, THRESHOLD)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--theaters', type=int, default=30)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--movies', type=int, default=20)
+    parser.add_argument('--times', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    set_cutoff('00:00') # i.e. keep all of today's showtimes, as per-theater path does
+
+    listings = get_listings(args.theaters, args.days, args.movies, args.times)
+    n = sum(len(showtimes) for _, showtimes, _ in listings)
+
+    # same output either way
+    to_groups = lambda filtered: [list(showtimes.iter_groups()) for showtimes in filtered]
+    assert to_groups(per_theater(listings)) == to_groups(batched(listings))
+
+    print(f'{len(listings)} listings, {n} showtimes')
+
+    for name, fn in (('per-theater', per_theater), ('batched', batched)):
+        t = min(timeit.repeat(lambda: fn(listings), number=1, repeat=args.repeat))
+        print(f'{name:>12}: {t * 1e3:8.1f} ms')
@@ -0,0 +1,50 @@
+"""Benchmark partial (`parse_only`) vs. full-tree parsing of a saved page
+
+$ python benchmarks/bench_parse.py path/to/page.html --scraper amc [--repeat N]
+"""
+import argparse
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from fetch import parse, PARSER
+from scrapers import D_PARSE_ONLY
+
+
+def peak_memory(fn):
+    """Peak memory allocated while running `fn` (bytes)"""
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('page', help='path/to/page.html')
+    parser.add_argument('--scraper', choices=sorted(D_PARSE_ONLY), required=True)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.page, 'rb') as f:
+        content = f.read()
+
+    strainer = D_PARSE_ONLY[args.scraper]
+
+    # same relevant tags either way
+    n_full = len(parse(content).find_all(strainer))
+    n_partial = len(parse(content, strainer).find_all(strainer))
+    assert n_full == n_partial, f'{n_full} != {n_partial}'
+
+    print(f'{args.page} ({len(content) / 1024:.0f} kB, parser: {PARSER}, '
+          f'{n_full} matching tags)')
+
+    for name, parse_only in (('full', None), ('parse_only', strainer)):
+        fn = lambda: parse(content, parse_only)
+        t = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        print(f'{name:>12}: {t * 1e3:8.1f} ms, peak {peak_memory(fn) / 1024**2:6.1f} MB')
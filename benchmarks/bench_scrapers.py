@@ -0,0 +1,111 @@
+"""Record live responses as fixtures, or replay them (offline) through every scraper
+
+$ python benchmarks/bench_scrapers.py --record [--cities nyc pgh ..] [fixtures/yyyy-mm-dd]
+$ python benchmarks/bench_scrapers.py [--repeat N] [--json report.json] fixtures/yyyy-mm-dd
+"""
+import argparse
+from datetime import datetime
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+DIRNAME = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, DIRNAME)
+from fetch import using_fixtures
+from get_movies import get_action, get_movies
+from utils import get_cities, get_theaters, set_cutoff, set_today
+
+
+def record(dirname, cities):
+    """Scrape all theaters in `cities` (today), recording responses"""
+    date = datetime.now().strftime('%Y-%m-%d')
+    theaters = list(dict.fromkeys(t for city in cities for t in get_theaters(city)))
+
+    with using_fixtures(dirname, record=True) as fixtures:
+        recorded_at = datetime.now().isoformat()
+        set_cutoff(recorded_at)
+
+        for theater in theaters:
+            try:
+                get_movies(theater, date)
+                print(f'recorded {theater}')
+            except(Exception) as e:
+                print(f'[ {theater} failed: {e!r} ]')
+
+        fixtures.meta = dict(date=date, recorded_at=recorded_at, theaters=theaters)
+
+
+def replay(dirname, repeat=5):
+    """Replay fixtures through each theater's scraper
+
+    :returns: list of dicts (per theater)
+    """
+    rows = []
+
+    with using_fixtures(dirname) as fixtures:
+        meta = fixtures.meta
+        assert meta, f'no fixtures recorded in {dirname}'
+
+        date = meta['date']
+        set_cutoff(meta['recorded_at']) # as if at recording time
+        set_today(meta['recorded_at'])  # (incl. for day labels, "today", ..)
+
+        for theater in meta['theaters']:
+            row = dict(theater=theater, scraper=get_action(theater).__name__)
+            scrape = lambda: get_movies(theater, date)
+
+            try:
+                showtimes = scrape()
+            except(Exception) as e:
+                rows.append(dict(row, error=repr(e)))
+                continue
+
+            tracemalloc.start()
+            scrape()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            rows.append(dict(
+                row,
+                seconds=min(timeit.repeat(scrape, number=1, repeat=repeat)),
+                peak_bytes=peak,
+                n_movies=len(showtimes.unique_titles()),
+                n_showtimes=len(showtimes)))
+    return rows
+
+
+def print_report(rows):
+    cols = ('theater', 'scraper', 'ms', 'peak MB', 'movies', 'times')
+    print('{:<28} {:<40} {:>8} {:>8} {:>7} {:>6}'.format(*cols))
+    for row in sorted(rows, key=lambda row: -row.get('seconds', -1)): # slowest first
+        if 'error' in row:
+            print('{theater:<28} {scraper:<40} {error}'.format(**row))
+            continue
+        print('{:<28} {:<40} {:>8.1f} {:>8.2f} {:>7} {:>6}'.format(
+            row['theater'], row['scraper'], row['seconds'] * 1e3,
+            row['peak_bytes'] / 1024**2, row['n_movies'], row['n_showtimes']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('dirname', nargs='?', default=os.path.join(
+        DIRNAME, 'fixtures', datetime.now().strftime('%Y-%m-%d')),
+                        help='path/to/fixtures (default: fixtures/<today>)')
+    parser.add_argument('--record', action='store_true',
+                        help='record live responses (default: replay offline)')
+    parser.add_argument('--cities', nargs='*', default=get_cities())
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', default=None, help='path/to/report.json')
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.dirname, args.cities)
+    else:
+        rows = replay(args.dirname, repeat=args.repeat)
+        print_report(rows)
+
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(rows, f, indent=2)
@@ -0,0 +1,96 @@
+"""Benchmark cold startup of `get_movies.py` -- each run in a fresh interpreter
+
+$ python benchmarks/bench_startup.py [--repeat N] [--theater THEATER] [fixtures/yyyy-mm-dd]
+"""
+import argparse
+from datetime import datetime
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+DIRNAME = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+SCRIPT = os.path.join(DIRNAME, 'get_movies.py')
+
+# single-theater query, replayed offline (see `bench_scrapers.py --record`)
+QUERY = '''
+import sys
+sys.path.insert(0, {dirname!r})
+from fetch import using_fixtures
+from get_movies import get_movies, print_movies
+from utils import set_cutoff, set_today
+
+with using_fixtures({fixtures!r}) as fixtures:
+    set_cutoff(fixtures.meta['recorded_at'])
+    set_today(fixtures.meta['recorded_at'])
+    print_movies({theater!r}, get_movies({theater!r}, fixtures.meta['date']))
+'''
+
+
+def time_cold(cmd, repeat=10):
+    """Run `cmd` in fresh interpreters
+
+    :cmd: list of strs
+    :repeat: int
+    :returns: list of floats (s)
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=DIRNAME, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def count_imports(cmd):
+    """Count modules imported by `cmd` (via `python -X importtime`)
+
+    :cmd: list of strs (starting with python executable)
+    :returns: int
+    """
+    r = subprocess.run([cmd[0], '-X', 'importtime', *cmd[1:]], cwd=DIRNAME, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return sum(line.startswith('import time:') for line in r.stderr.splitlines()) - 1 # (header)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('fixtures', nargs='?', default=os.path.join(
+        DIRNAME, 'fixtures', datetime.now().strftime('%Y-%m-%d')),
+                        help='path/to/fixtures, for single-theater query (default: fixtures/<today>)')
+    parser.add_argument('--theater', default=None,
+                        help='theater to query (default: first recorded)')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        moviefile = os.path.join(tmpdir, 'movies_bench')
+        with open(moviefile, 'w') as f:
+            f.write('\n'.join(f'movie #{i}' for i in range(20)))
+
+        cmds = {
+            '--help': [sys.executable, SCRIPT, '--help'],
+            '-f moviefile --simple': [sys.executable, SCRIPT, '-f', moviefile, '--simple'],
+        }
+
+        if os.path.exists(os.path.join(args.fixtures, 'meta.json')):
+            theater = args.theater
+            if theater is None:
+                import json
+                with open(os.path.join(args.fixtures, 'meta.json')) as f:
+                    theater = json.load(f)['theaters'][0]
+
+            cmds[f'query {theater!r}'] = [sys.executable, '-c', QUERY.format(
+                dirname=DIRNAME, fixtures=args.fixtures, theater=theater)]
+        else:
+            print(f'[ no fixtures in {args.fixtures} -- skipping single-theater query ]\n',
+                  file=sys.stderr)
+
+        col_space = max(map(len, cmds))
+        print(f'{"":{col_space}}  {"min (ms)":>10}{"median (ms)":>13}{"modules":>9}')
+        for label, cmd in cmds.items():
+            times = time_cold(cmd, repeat=args.repeat)
+            print(f'{label:{col_space}}  {min(times) * 1e3:10.1f}'
+                  f'{statistics.median(times) * 1e3:13.1f}{count_imports(cmd):9}')
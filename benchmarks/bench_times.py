@@ -0,0 +1,91 @@
+"""Benchmark showtime parsing: `utils.filter_past` vs. the former dateutil-per-showtime path
+
+$ python benchmarks/bench_times.py [--theaters N] [--days N] [--repeat N]
+"""
+import argparse
+from datetime import datetime, timedelta
+import os
+import random
+import re
+import sys
+import timeit
+
+from dateutil import parser as dparser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import utils
+from utils import filter_past, set_cutoff, DATETIME_SEP
+
+
+def filter_past_dateutil(datetimes, cutoff=None, sep=DATETIME_SEP):
+    """Reference: former `filter_past` (parses every showtime w/ dateutil)"""
+    cutoff = datetime.now() if cutoff is None else dparser.parse(cutoff)
+
+    if not datetimes:
+        return []
+
+    def clean_time(t):
+        PATTERN = re.compile('(^.*[0-9] *((p|a)m)?).*$', re.I)
+        return re.sub(PATTERN, r'\1', t)
+
+    def clean_datetime(dt, sep=sep):
+        date, time = dt.split(sep)
+        return ', '.join((date, clean_time(time)))
+
+    is_past = lambda dt: (
+        dparser.parse(clean_datetime(dt))
+        - cutoff
+    ).total_seconds() < 0
+
+    PATTERN = re.compile(' *((a|p)m)')
+    strftime = lambda dt: re.sub(PATTERN, r'\1',
+                                 dt.split(DATETIME_SEP)[-1].strip().lower())
+
+    is_nested_list = isinstance(datetimes[0], list)
+
+    return ([[strftime(dt) for dt in dts if not is_past(dt)]
+             for dts in datetimes] if is_nested_list else
+           [[strftime(dt)]
+            if not is_past(dt) else [] for dt in datetimes])
+
+
+def make_listings(n_theaters, n_days, n_movies=15, n_times=4, seed=0):
+    """Fake per-theater lists of lists of "date @ time" strs"""
+    rng = random.Random(seed)
+    today = datetime.now()
+
+    def showtime(date):
+        h, m = rng.randint(10, 23), rng.choice((0, 15, 30, 45))
+        return DATETIME_SEP.join((date, '{}:{:02d}{}'.format(
+            (h - 1) % 12 + 1, m, rng.choice(('pm', ' pm', 'PM')) if h >= 12 else 'am')))
+
+    return [[[showtime((today + timedelta(days=day)).strftime('%Y-%m-%d'))
+              for _ in range(n_times)] for _ in range(n_movies)]
+            for _ in range(n_theaters) for day in range(n_days)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--theaters', type=int, default=30)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    listings = make_listings(args.theaters, args.days)
+    set_cutoff()
+
+    assert ([filter_past(l) for l in listings] ==
+            [filter_past_dateutil(l) for l in listings]), 'results differ'
+
+    def filter_past_cold(datetimes):
+        utils._parse_datetime.cache_clear()
+        utils.format_time.cache_clear()
+        return filter_past(datetimes)
+
+    n = sum(len(times) for l in listings for times in l)
+    for name, fn in (('dateutil', filter_past_dateutil),
+                     ('cold', filter_past_cold),  # (memo cleared per theater)
+                     ('filter_past', filter_past)):
+        t = min(timeit.repeat(lambda: [fn(l) for l in listings],
+                              number=1, repeat=args.repeat))
+        print(f'{name:>12}: {t * 1e3:8.1f} ms  ({n} showtimes, {t / n * 1e6:.2f} µs each)')
@@ -0,0 +1,134 @@
+from collections import Counter
+import os
+import time
+
+from fetch import get_cache, DeadlineExceeded
+from store import SQLiteStore
+from utils import CACHE_DIR, DateNotListed
+
+
+HOUR = 60 * 60 # s
+
+MAX_FAILURES = 3  # consecutive, before skipping source
+COOLDOWN = 6 * HOUR
+WINDOW = 15 * 60  # s within which repeat failures count once (i.e. per run, e.g. over `--days`)
+
+_BREAKERS = None
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreakers(SQLiteStore):
+    """Circuit breakers per source (e.g. scraper & theater), persisted (& shared) across runs --
+    after `max_failures` consecutive failures, a source is skipped for `cooldown` s (then retried once)
+    """
+
+    SCHEMA = '''CREATE TABLE IF NOT EXISTS breakers (
+                    source TEXT PRIMARY KEY,
+                    failures INTEGER NOT NULL,
+                    failed_at REAL NOT NULL,
+                    opened_at REAL)'''
+
+    def __init__(self, path=os.path.join(CACHE_DIR, 'breakers.db'), max_failures=MAX_FAILURES,
+                 cooldown=COOLDOWN):
+        super().__init__(path)
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.stats = Counter() # skipped, per run
+
+    def is_open(self, source):
+        """Is source known to be down (& still cooling down) ?
+
+        N.B. read every time, e.g. since opened by another process (prefetcher, server, ..)
+
+        :source: str
+        :returns: bool
+        """
+        with self._lock:
+            row = self._db.execute('SELECT failures, opened_at FROM breakers WHERE source = ?',
+                                   (source,)).fetchone()
+        if row is None:
+            return False
+
+        failures, opened_at = row
+        return failures >= self.max_failures and time.time() - opened_at < self.cooldown
+
+    def record(self, source, ok):
+        """Record success (closing breaker) or failure (opening breaker, if too many in a row
+        -- counting failures once per `WINDOW`, e.g. per run)
+
+        :source: str
+        :ok: bool
+        """
+        with self._lock, self._db:
+            if ok:
+                self._db.execute('DELETE FROM breakers WHERE source = ?', (source,))
+                return
+
+            self._db.execute('BEGIN IMMEDIATE') # (read & write w/o other processes in between)
+            row = self._db.execute('SELECT failures, failed_at, opened_at FROM breakers WHERE source = ?',
+                                   (source,)).fetchone()
+            failures, failed_at, opened_at = row if row is not None else (0, 0, None)
+
+            now = time.time()
+            if now - failed_at < WINDOW:
+                return # (already counted)
+
+            failures += 1
+            if failures >= self.max_failures: # (re)open
+                opened_at = now
+            self._db.execute('INSERT OR REPLACE INTO breakers VALUES (?, ?, ?, ?)',
+                             (source, failures, now, opened_at))
+
+    def call(self, source, fn, *args, **kwargs):
+        """Call `fn`, unless source is known to be down
+
+        :source: str
+        :fn: function
+        :returns: result of `fn`
+        :raises: CircuitOpen
+        """
+        if self.is_open(source):
+            self.stats['skipped'] += 1
+            raise(CircuitOpen(f'{source} is down'))
+
+        try:
+            result = fn(*args, **kwargs)
+        except(DeadlineExceeded, DateNotListed) as e: # (out of time, or date not listed yet -- rather than source failing)
+            raise(e)
+        except(Exception) as e:
+            self.record(source, ok=False)
+            raise(e)
+
+        self.record(source, ok=True)
+        return result
+
+
+def get_breakers():
+    """Get circuit breakers (only if caching, & not using fixtures)
+
+    :returns: CircuitBreakers or None
+    """
+    global _BREAKERS
+
+    if get_cache() is None:
+        return None
+
+    if _BREAKERS is None:
+        _BREAKERS = CircuitBreakers()
+    return _BREAKERS
+
+
+def guard(source, fn, *args, **kwargs):
+    """Call `fn` via `source`'s circuit breaker (if any)
+
+    :source: str (e.g. "scraper:theater")
+    :fn: function
+    :returns: result of `fn`
+    :raises: CircuitOpen
+    """
+    breakers = get_breakers()
+    return (breakers.call(source, fn, *args, **kwargs) if breakers is not None else
+            fn(*args, **kwargs))
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+from urllib.parse import urlparse
+import zlib
+
+from utils import CACHE_DIR
+
+
+MINUTE = 60 # s
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+DEFAULT_TTL = 15 * MINUTE
+
+# per-source TTLs, by host (or host/path prefix)
+D_TTLS = {
+    'www.google.com': 5 * MINUTE,           # (only) upcoming times
+    'www.showtimes.com/search': 7 * DAY,    # theater pages don't move
+    'feeds.drafthouse.com': 15 * MINUTE,    # whole calendar
+    'loewsjersey.org': HOUR,                # whole month
+    'somervilletheatre.com': HOUR,
+}
+
+MAX_BYTES = 50 * 1024**2
+
+
+class ResponseCache:
+    """Disk-backed, compressed cache of raw responses (keyed by URL & params),
+    with per-source TTLs, ETag / Last-Modified revalidation & LRU eviction
+    """
+
+    def __init__(self, dirname=os.path.join(CACHE_DIR, 'http'), max_bytes=MAX_BYTES,
+                 ttls=D_TTLS, default_ttl=DEFAULT_TTL):
+        self.dirname = dirname
+        self.max_bytes = max_bytes
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+
+        os.makedirs(self.dirname, exist_ok=True)
+
+    def _path(self, url, params=None):
+        key = json.dumps([url, params or {}], sort_keys=True, default=str)
+        return os.path.join(self.dirname,
+                            hashlib.sha1(key.encode()).hexdigest() + '.z')
+
+    def ttl(self, url):
+        """Get time-to-live for responses from `url`'s source
+
+        :url: str
+        :returns: int (s)
+        """
+        parsed = urlparse(url)
+        source = parsed.netloc.lower() + parsed.path
+
+        matches = [k for k in self.ttls if source.startswith(k)]
+        return (self.ttls[max(matches, key=len)] if matches # most specific
+                else self.default_ttl)
+
+    def get(self, url, params=None):
+        """Get cached entry (fresh or stale), if any
+
+        :url: str
+        :params: dict of query params
+        :returns: dict {content, etag, last_modified, fetched_at} or None
+        """
+        path = self._path(url, params)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.loads(zlib.decompress(f.read()))
+            os.utime(path) # mark as recently used
+        except(FileNotFoundError, EOFError, zlib.error, pickle.UnpicklingError):
+            return None
+
+        return entry
+
+    def is_fresh(self, entry, url):
+        """Is cached `entry` for `url` still within its TTL ?"""
+        return time.time() - entry['fetched_at'] < self.ttl(url)
+
+    def validators(self, entry):
+        """Get headers to conditionally revalidate (stale) `entry`
+
+        :entry: dict
+        :returns: dict of request headers
+        """
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, url, params, content, headers=None):
+        """Cache response `content` (& validators from response `headers`)
+
+        :url: str
+        :params: dict of query params
+        :content: bytes
+        :headers: response headers (case-insensitive mapping)
+        :returns: dict (entry)
+        """
+        headers = headers or {}
+        entry = dict(content=content,
+                     etag=headers.get('ETag'),
+                     last_modified=headers.get('Last-Modified'),
+                     fetched_at=time.time())
+
+        path = self._path(url, params)
+        fd, tmp = tempfile.mkstemp(dir=self.dirname, suffix='.tmp') # (unique, even across threads)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(zlib.compress(pickle.dumps(entry)))
+            os.replace(tmp, path) # atomic
+        except(Exception) as e:
+            os.remove(tmp)
+            raise(e)
+
+        self.evict()
+        return entry
+
+    def refresh(self, url, params, entry):
+        """Restart TTL for revalidated (i.e. 304 Not Modified) `entry`"""
+        return self.put(url, params, entry['content'],
+                        {'ETag': entry.get('etag'),
+                         'Last-Modified': entry.get('last_modified')})
+
+    def evict(self):
+        """Evict least recently used entries until under `max_bytes`"""
+        entries = []
+        for f in os.scandir(self.dirname):
+            try:
+                stat = f.stat()
+                if f.name.endswith('.tmp'): # being written -- unless left behind (e.g. by a killed run)
+                    if time.time() - stat.st_mtime > HOUR:
+                        os.remove(f.path)
+                    continue
+            except(FileNotFoundError): # evicted (or renamed) meanwhile
+                continue
+            entries.append((stat.st_mtime, stat.st_size, f.path))
+
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in sorted(entries): # oldest first
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except(FileNotFoundError):
+                pass
+            total -= size
+
+    def clear(self):
+        for f in os.scandir(self.dirname):
+            os.remove(f.path)
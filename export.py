@@ -0,0 +1,150 @@
+import csv
+from datetime import datetime, timedelta, timezone
+import hashlib
+import json
+import sys
+
+from showtimes import NO_TIME
+
+
+FORMATS = ('ndjson', 'csv', 'ical')
+
+FIELDS = ('theater', 'date', 'title', 'format', 'time', 'start', 'sold_out', 'rating')
+
+
+def iter_records(theater, date, showtimes, d_ratings=None):
+    """Flatten listing into one record per showtime
+
+    :theater: str
+    :date: str (yyyy-mm-dd) (or None, if from file)
+    :showtimes: Showtimes
+    :d_ratings: dict {title: float} (default: no ratings)
+    :yields: dict (see `FIELDS`)
+    """
+    day = datetime.strptime(date, '%Y-%m-%d') if date else None
+
+    for showtime in showtimes:
+        rating = d_ratings.get(showtime.title, -1) if d_ratings is not None else -1
+        start = (day + timedelta(minutes=showtime.start)
+                 if day is not None and showtime.start != NO_TIME else None)
+
+        yield dict(theater=theater, date=date, title=showtime.title, format=showtime.format,
+                   time=showtime.label or None,
+                   start=(start.isoformat(timespec='minutes') if start is not None else None),
+                   sold_out=showtime.sold_out, rating=(rating if rating >= 0 else None))
+
+
+class Exporter:
+    """Write listings as they come (w/o buffering the run), one record per showtime"""
+
+    def __init__(self, file=sys.stdout):
+        self.file = file
+
+    def write(self, theater, date, showtimes, d_ratings=None):
+        """Write listing for a single theater (& date), then flush
+
+        :theater: str
+        :date: str (yyyy-mm-dd) (or None, if from file)
+        :showtimes: Showtimes
+        :d_ratings: dict {title: float} (default: no ratings)
+        """
+        for record in iter_records(theater, date, showtimes, d_ratings):
+            self.write_record(record)
+        self.file.flush() # (even if piped)
+
+    def write_record(self, record):
+        raise(NotImplementedError)
+
+    def close(self):
+        pass
+
+
+class NDJSONExporter(Exporter):
+    """One json object per line"""
+
+    def write_record(self, record):
+        self.file.write(json.dumps(record) + '\n')
+
+
+class CSVExporter(Exporter):
+    """Rows, w/ header"""
+
+    def __init__(self, file=sys.stdout):
+        super().__init__(file)
+        self.writer = csv.DictWriter(file, fieldnames=FIELDS)
+        self.writer.writeheader()
+
+    def write_record(self, record):
+        self.writer.writerow(record)
+
+
+class ICalExporter(Exporter):
+    """iCalendar VEVENTs (in local time), skipping showtimes w/o start time"""
+
+    PRODID = '-//cinematic//get_movies.py//EN'
+
+    def __init__(self, file=sys.stdout):
+        super().__init__(file)
+        self.stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        self.write_lines(('BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{self.PRODID}'))
+
+    @staticmethod
+    def escape(text):
+        return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+                .replace('\n', '\\n'))
+
+    @staticmethod
+    def fold(line, width=75):
+        """Fold content line at `width` octets (continuation lines start with a space)"""
+        encoded = line.encode()
+        if len(encoded) <= width:
+            return line
+
+        chunks, i = [], 0
+        while i < len(encoded):
+            j = min(i + (width if not chunks else width - 1), len(encoded))
+            while j < len(encoded) and (encoded[j] & 0xC0) == 0x80: # (don't split utf-8 chars)
+                j -= 1
+            chunks.append(encoded[i:j].decode())
+            i = j
+        return '\r\n '.join(chunks)
+
+    def write_lines(self, lines):
+        self.file.write(''.join(f'{self.fold(line)}\r\n' for line in lines))
+
+    def write_record(self, record):
+        if record['start'] is None: # (can't schedule)
+            return
+
+        start = datetime.fromisoformat(record['start'])
+        uid = hashlib.sha1('|'.join((record['theater'], record['start'], record['title'],
+                                     record['format'])).encode()).hexdigest()
+
+        summary = (record['title'] + (f' [{record["format"]}]' if record['format'] else '')
+                   + (' (sold out)' if record['sold_out'] else ''))
+        description = (f'rating: {record["rating"]:.0%}' if record['rating'] is not None else
+                       None)
+
+        self.write_lines(line for line in (
+            'BEGIN:VEVENT',
+            f'UID:{uid}@cinematic',
+            f'DTSTAMP:{self.stamp}',
+            f'DTSTART:{start:%Y%m%dT%H%M%S}',
+            f'SUMMARY:{self.escape(summary)}',
+            f'LOCATION:{self.escape(record["theater"])}',
+            f'DESCRIPTION:{self.escape(description)}' if description else None,
+            'END:VEVENT') if line is not None)
+
+    def close(self):
+        self.write_lines(('END:VCALENDAR',))
+        self.file.flush()
+
+
+def get_exporter(fmt, file=sys.stdout):
+    """Get exporter for format
+
+    :fmt: str (see `FORMATS`)
+    :file: writable file (default: stdout)
+    :returns: Exporter
+    """
+    return dict(ndjson=NDJSONExporter, csv=CSVExporter, ical=ICalExporter)[fmt](file)
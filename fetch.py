@@ -0,0 +1,539 @@
+import asyncio
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from functools import partial
+import json
+import threading
+import time
+from urllib.parse import urlparse
+
+from CLIppy import soup_me as _soup_me_headless
+from cache import ResponseCache
+from fixtures import FixtureStore
+from timing import stage
+
+
+MAX_PER_HOST = 4 # concurrent requests per site
+
+MEMO_SIZE = 8 # parsed pages kept per run, besides any in progress (e.g. for theaters sharing a page)
+
+try:
+    import lxml
+    PARSER = 'lxml'        # faster
+except(ImportError):
+    PARSER = 'html.parser'
+
+CACHING = True # (see `no_cache`)
+_CACHE = None
+
+# recorded responses, while recording or replaying (see `using_fixtures`)
+_FIXTURES = None
+
+# recently parsed (& raw, if not cached on disk) pages, for the duration of a run (see `run_scope`)
+# -- per run, e.g. if several run concurrently
+_MEMO = ContextVar('memo', default=None)
+_MEMO_LOCK = threading.Lock()
+
+STATS = Counter()
+
+# event loop (& session) serving requests from worker threads, while running async
+_LOOP = None
+_LOOP_THREAD = None
+_SESSION = None
+_SEMAPHORES = {}
+
+# time by which all requests must finish (see `set_deadline`) -- & those for the current scrape (see `within`)
+_DEADLINE = None
+_SCRAPE_DEADLINE = ContextVar('scrape_deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def get_host(url):
+    """Get host to throttle requests by
+
+    :url: str
+    :returns: str
+    """
+    return urlparse(url).netloc.lower()
+
+
+@contextmanager
+def run_scope():
+    """Download & parse each distinct request only once within this context
+    (e.g. for theaters, or dates, sharing a source page)
+
+    N.B. only the last `MEMO_SIZE` parsed pages are kept (besides any in progress) -- others
+    are parsed again if requested again, from the on-disk cache (or raw pages kept for the run,
+    if not caching)
+
+    N.B. worker threads share the run's pages only if their work is `scoped`
+    """
+    token = _MEMO.set(dict(parsed=OrderedDict(), pages={}))
+    try:
+        yield
+    finally:
+        _MEMO.reset(token)
+
+
+def scoped(fn):
+    """Bind `fn` to the current run scope (if any), e.g. to call from worker threads
+
+    :fn: function
+    :returns: function
+    """
+    memo = _MEMO.get()
+
+    def wrapper(*args, **kwargs):
+        token = _MEMO.set(memo)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _MEMO.reset(token)
+    return wrapper
+
+
+def get_once(d_memo, key, fn, max_size=None):
+    """Get `fn()` -- only once for `key`, even if concurrently requested
+
+    :d_memo: dict (or OrderedDict, if bounded) {key: Future}
+    :key: hashable
+    :fn: function () -> result
+    :max_size: keep at most this many finished results, least recently used first out (default: all)
+    :returns: result of fn
+    """
+    with _MEMO_LOCK:
+        future = d_memo.get(key)
+        is_owner = future is None
+        if is_owner:
+            future = d_memo[key] = Future()
+        else:
+            STATS['memo_hits'] += 1
+            if max_size is not None:
+                d_memo.move_to_end(key)
+
+    if is_owner:
+        try:
+            future.set_result(fn())
+        except(Exception) as e: # (don't retry while kept)
+            future.set_exception(e)
+
+        if max_size is not None:
+            with _MEMO_LOCK: # (never drop one still in progress)
+                done = [k for k, f in d_memo.items() if f.done()]
+                for k in done[:max(len(d_memo) - max_size, 0)]:
+                    del d_memo[k]
+
+    return future.result()
+
+
+def memoized(fn, url, params=None, **kwargs):
+    """Get `fn(url, params, **kwargs)` -- only once per run (while recently used),
+    even if concurrently requested
+
+    :fn: function (e.g. page -> soup)
+    :url: str
+    :params: dict of query params
+    :returns: result of fn
+    """
+    memo = _MEMO.get()
+    if memo is None: # not within `run_scope`
+        return fn(url, params, **kwargs)
+
+    key = (fn.__name__, url, json.dumps(params, sort_keys=True, default=str),
+           json.dumps(kwargs, sort_keys=True, default=repr)) # e.g. different `parse_only`s
+
+    return get_once(memo['parsed'], key, partial(fn, url, params, **kwargs),
+                    max_size=MEMO_SIZE)
+
+
+@contextmanager
+def using_fixtures(dirname, record=False):
+    """Record all responses to (or replay them from) fixtures, bypassing cache
+    (& network, if replaying)
+
+    :dirname: str
+    :record: record (or replay) ?
+    :returns: FixtureStore
+    """
+    global _FIXTURES
+
+    _FIXTURES = FixtureStore(dirname, recording=record)
+    try:
+        yield _FIXTURES
+    finally:
+        _FIXTURES = None
+
+
+def get_cache():
+    """Get on-disk response cache (if caching, & not using fixtures)
+
+    :returns: ResponseCache or None
+    """
+    global _CACHE
+
+    if _FIXTURES is not None:
+        return None
+
+    if _CACHE is None and CACHING:
+        _CACHE = ResponseCache()
+    return _CACHE
+
+
+def no_cache():
+    """Bypass response cache for this run"""
+    global CACHING, _CACHE
+    CACHING, _CACHE = False, None
+
+
+def from_cache(url, params=None, headers=None):
+    """Look up cached (or, if replaying, recorded) response for request
+
+    :url: str
+    :params: dict of query params
+    :headers: dict of request headers
+    :returns: (content if fresh else None, cached entry, headers incl. validators)
+    """
+    if _FIXTURES is not None and not _FIXTURES.recording:
+        return _FIXTURES.load(url, params), None, headers # never hits network
+
+    cache = get_cache()
+    entry = cache.get(url, params) if cache is not None else None
+
+    if entry is None:
+        return None, None, headers
+    if cache.is_fresh(entry, url):
+        return entry['content'], entry, headers
+
+    return None, entry, {**(headers or {}), **cache.validators(entry)} # revalidate
+
+
+def to_cache(url, params, entry, status, content, headers):
+    """Cache (or, if recording, record) response -- or reuse cached `entry`, if not modified
+
+    :url: str
+    :params: dict of query params
+    :entry: cached entry (or None)
+    :status: int (HTTP status)
+    :content: bytes
+    :headers: response headers
+    :returns: bytes (content)
+    """
+    if _FIXTURES is not None and _FIXTURES.recording:
+        _FIXTURES.save(url, params, content)
+
+    cache = get_cache()
+
+    if status == 304 and entry is not None: # not modified
+        cache.refresh(url, params, entry)
+        return entry['content']
+
+    if cache is not None and 200 <= status < 300:
+        cache.put(url, params, content, headers)
+
+    return content
+
+
+def set_deadline(seconds):
+    """Bound all requests to finish within `seconds` from now
+
+    :seconds: float (or None, for no deadline)
+    """
+    global _DEADLINE
+    _DEADLINE = time.monotonic() + seconds if seconds is not None else None
+
+
+@contextmanager
+def within(seconds):
+    """Bound requests within this context (e.g. a single scrape) to finish within `seconds` from now
+    -- as well as by the run's deadline, if any
+
+    :seconds: float
+    """
+    token = _SCRAPE_DEADLINE.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _SCRAPE_DEADLINE.reset(token)
+
+
+def get_deadline():
+    """Get time by which current requests must finish, if any
+
+    :returns: float (`time.monotonic()`) or None
+    """
+    return min((deadline for deadline in (_DEADLINE, _SCRAPE_DEADLINE.get())
+                if deadline is not None), default=None)
+
+
+def get_timeout():
+    """Get request timeout, bounded by time left before deadline (if any)
+
+    :returns: tuple (connect, read) (s)
+    :raises: DeadlineExceeded
+    """
+    from sessions import TIMEOUT # (requests & co only imported once fetching)
+
+    deadline = get_deadline()
+    if deadline is None:
+        return TIMEOUT
+
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise(DeadlineExceeded('Deadline exceeded'))
+
+    return tuple(min(t, remaining) for t in TIMEOUT)
+
+
+def is_timeout(e):
+    """Did request time out -- incl. once retries ran out (requests), or via aiohttp ?
+
+    :e: Exception
+    :returns: bool
+    """
+    from requests.exceptions import Timeout
+    from urllib3.exceptions import TimeoutError as Urllib3Timeout
+
+    reason = getattr(e.args[0], 'reason', None) if e.args else None # e.g. MaxRetryError
+    return isinstance(e, (Timeout, asyncio.TimeoutError)) or isinstance(reason, Urllib3Timeout)
+
+
+def check_deadline(e, timeout):
+    """Raise DeadlineExceeded instead of request error `e`, if it timed out since deadline cut
+    its timeout short
+
+    :e: Exception
+    :timeout: tuple (connect, read), as requested with (see `get_timeout`)
+    :raises: DeadlineExceeded
+    """
+    from sessions import TIMEOUT
+
+    if get_deadline() is not None and timeout != TIMEOUT and is_timeout(e):
+        raise DeadlineExceeded('Deadline exceeded') from e
+
+
+def get(url, params=None, headers=None, **kwargs):
+    """Get page content (via on-disk cache, if fresh)
+
+    :url: str
+    :params: dict of query params
+    :headers: dict of request headers
+    :kwargs: passed to `requests.get`
+    :returns: bytes
+    """
+    content, entry, headers = from_cache(url, params, headers)
+    if content is not None:
+        return content
+
+    from sessions import get_session
+
+    timeout = get_timeout()
+    try: # (w/o retries if bounded by deadline)
+        r = get_session(retries=(get_deadline() is None)).get(
+            url, params=params, headers=headers, timeout=timeout, **kwargs)
+    except(Exception) as e:
+        check_deadline(e, timeout)
+        raise(e)
+
+    return to_cache(url, params, entry, r.status_code, r.content, r.headers)
+
+
+def is_moved(url):
+    """Is page gone (404 / 410) or moved (redirect) ? -- checked directly (uncached), e.g. before
+    dropping a stored URL
+
+    :url: str
+    :returns: bool (False if unsure, e.g. request failed)
+    """
+    from sessions import get_session
+
+    try:
+        r = get_session(retries=False).head(url, allow_redirects=False, timeout=get_timeout())
+    except(Exception): # (e.g. offline, or out of time)
+        return False
+
+    return r.status_code in (404, 410) or r.is_redirect
+
+
+def get_semaphore(host):
+    """Get semaphore bounding concurrent requests to `host` (must be called on the loop)
+
+    :host: str
+    :returns: asyncio.Semaphore
+    """
+    try:
+        return _SEMAPHORES[host]
+    except(KeyError):
+        return _SEMAPHORES.setdefault(host, asyncio.Semaphore(MAX_PER_HOST))
+
+
+@asynccontextmanager
+async def fetching(max_per_host=None):
+    """Share a single event loop & HTTP session for all requests within this context
+
+    :max_per_host: int (default: MAX_PER_HOST)
+    """
+    global _LOOP, _LOOP_THREAD, _SESSION, MAX_PER_HOST
+
+    try:
+        import aiohttp
+    except(ImportError) as e:
+        e.args = ('[  Async mode needs aiohttp -- `pip install aiohttp`  ]',)
+        raise(e)
+
+    from sessions import get_trace_config, ACCEPT_ENCODING, TIMEOUT
+
+    if max_per_host is not None:
+        MAX_PER_HOST = max_per_host
+
+    connect_timeout, read_timeout = TIMEOUT
+    async with aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=MAX_PER_HOST, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout),
+            headers={'Accept-Encoding': ACCEPT_ENCODING},
+            trace_configs=[get_trace_config()]) as session:
+        _LOOP, _LOOP_THREAD, _SESSION = (asyncio.get_running_loop(),
+                                          threading.get_ident(), session)
+        try:
+            yield session
+        finally:
+            _LOOP, _LOOP_THREAD, _SESSION = None, None, None
+            _SEMAPHORES.clear()
+
+
+async def aget(url, params=None, headers=None, **kwargs):
+    """Get page content, throttled per host (via on-disk cache, if fresh)
+
+    :url: str
+    :params: dict of query params
+    :headers: dict of request headers
+    :returns: bytes
+    """
+    assert _SESSION is not None, 'no session -- use within `async with fetching()`'
+
+    loop = asyncio.get_running_loop() # (disk i/o off the loop, so as not to hold up other requests)
+
+    content, entry, headers = await loop.run_in_executor(None, from_cache, url, params, headers)
+    if content is not None:
+        return content
+
+    import aiohttp
+
+    connect_timeout, read_timeout = get_timeout()
+    timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout,
+                                    total=(read_timeout if get_deadline() is not None else None))
+
+    try:
+        async with get_semaphore(get_host(url)):
+            async with _SESSION.get(url, params=params, headers=headers, timeout=timeout) as r:
+                content = await r.read()
+    except(Exception) as e:
+        check_deadline(e, (connect_timeout, read_timeout))
+        raise(e)
+
+    return await loop.run_in_executor(None, to_cache, url, params, entry, r.status, content,
+                                      r.headers)
+
+
+def parse(content, parse_only=None):
+    """Parse page (or only the parts matching `parse_only`)
+
+    :content: bytes
+    :parse_only: bs4.SoupStrainer (default: parse all)
+    :returns: BeautifulSoup
+    """
+    from bs4 import BeautifulSoup # (only imported once parsing)
+
+    return BeautifulSoup(content, PARSER, parse_only=parse_only)
+
+
+def _on_loop(coro):
+    """Run coroutine on the shared event loop, from a worker thread
+
+    :coro: coroutine
+    :returns: its result
+    """
+    scrape_deadline = _SCRAPE_DEADLINE.get() # (context isn't carried over to the loop's thread)
+
+    async def run():
+        _SCRAPE_DEADLINE.set(scrape_deadline) # (within task's own context)
+        return await coro
+
+    return asyncio.run_coroutine_threadsafe(run(), _LOOP).result()
+
+
+def is_async():
+    """Are requests currently being served by a shared event loop (from another thread) ?"""
+    return _LOOP is not None and threading.get_ident() != _LOOP_THREAD
+
+
+def fetch(url, params=None, **kwargs):
+    """Get page content -- via the shared event loop, if running async
+
+    :url: str
+    :params: dict of query params
+    :kwargs: e.g. headers
+    :returns: bytes
+    """
+    def _fetch():
+        with stage('fetch'):
+            return (_on_loop(aget(url, params, **kwargs)) if is_async() else
+                    get(url, params, **kwargs))
+
+    memo = _MEMO.get()
+    if memo is None or get_cache() is not None: # (else re-read from on-disk cache, if need be)
+        return _fetch()
+
+    key = (url, json.dumps(params, sort_keys=True, default=str),
+           json.dumps(kwargs, sort_keys=True, default=repr))
+    return get_once(memo['pages'], key, _fetch) # (raw pages, for the run)
+
+
+def _soup_me(url, params=None, from_headless=False, parse_only=None, **kwargs):
+    if from_headless: # (always parses all)
+        args = (url,) if params is None else (url, params)
+        with stage('fetch'):
+            return _soup_me_headless(*args, from_headless=True, **kwargs)
+
+    content = fetch(url, params, **kwargs)
+
+    with stage('parse'): # (in this thread, even if running async)
+        return parse(content, parse_only)
+
+
+def _json_me(url, params=None, **kwargs):
+    content = fetch(url, params, **kwargs)
+
+    with stage('parse'):
+        return json.loads(content)
+
+
+def soup_me(url, params=None, from_headless=False, parse_only=None, **kwargs):
+    """Get page as soup -- via the shared event loop, if running async
+    (& only once per run, if within `run_scope`)
+
+    :url: str
+    :params: dict of query params
+    :from_headless: render via headless browser (uncached) ?
+    :parse_only: bs4.SoupStrainer, for heavy pages (default: parse all)
+    :kwargs: e.g. headers
+    :returns: BeautifulSoup
+    """
+    return memoized(_soup_me, url, params, from_headless=from_headless,
+                    parse_only=parse_only, **kwargs)
+
+
+def json_me(url, params=None, **kwargs):
+    """Get page as json -- via the shared event loop, if running async
+    (& only once per run, if within `run_scope`)
+
+    :url: str
+    :params: dict of query params
+    :kwargs: e.g. headers
+    :returns: dict (or list)
+    """
+    return memoized(_json_me, url, params, **kwargs)
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import threading
+
+
+class FixtureMissing(LookupError):
+    pass
+
+
+class FixtureStore:
+    """Raw responses saved to disk (keyed by URL & params), for offline replay"""
+
+    INDEX = 'index.json' # key -> request
+    META = 'meta.json'   # e.g. date & time recorded
+
+    def __init__(self, dirname, recording=False):
+        self.dirname = dirname
+        self.recording = recording
+        self._lock = threading.Lock()
+
+        if recording:
+            os.makedirs(self.dirname, exist_ok=True)
+
+    @staticmethod
+    def key(url, params=None):
+        key = json.dumps([url, params or {}], sort_keys=True, default=str)
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def _read_json(self, fname, default):
+        try:
+            with open(os.path.join(self.dirname, fname)) as f:
+                return json.load(f)
+        except(FileNotFoundError):
+            return default
+
+    def _write_json(self, fname, d):
+        with open(os.path.join(self.dirname, fname), 'w') as f:
+            json.dump(d, f, indent=2, sort_keys=True)
+
+    def load(self, url, params=None):
+        """Get recorded response
+
+        :url: str
+        :params: dict of query params
+        :returns: bytes
+        """
+        try:
+            with open(os.path.join(self.dirname, self.key(url, params)), 'rb') as f:
+                return f.read()
+        except(FileNotFoundError):
+            raise(FixtureMissing(f'No fixture for {url} {params or ""}'))
+
+    def save(self, url, params, content):
+        """Record response
+
+        :url: str
+        :params: dict of query params
+        :content: bytes
+        """
+        key = self.key(url, params)
+
+        with open(os.path.join(self.dirname, key), 'wb') as f:
+            f.write(content)
+
+        with self._lock:
+            index = self._read_json(self.INDEX, {})
+            index[key] = dict(url=url, params=params)
+            self._write_json(self.INDEX, index)
+
+    @property
+    def meta(self):
+        return self._read_json(self.META, {})
+
+    @meta.setter
+    def meta(self, d):
+        with self._lock:
+            self._write_json(self.META, d)
@@ -1,110 +1,374 @@
 import argparse
-from functools import partial, reduce
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from itertools import zip_longest
-import operator
-import re
+import os
+import queue
+import sys
+import threading
+import time
 
 from CLIppy import convert_date, get_from_file, pprint_header_with_lines
 
-from scrapers import *
-from utils import filter_by_rating, get_theaters, NoMoviesException
+from breaker import get_breakers, guard, CircuitOpen
+from export import get_exporter, FORMATS
+from fetch import fetching, no_cache, run_scope, scoped, set_deadline, within, DeadlineExceeded
+import hedge
+import timing
+from timing import for_theater, stage
+from showtimes import Showtimes
+from store import ListingsStore, SnapshotStore
+from utils import (error_str, filter_by_rating, get_cutoff, get_dates, get_theaters, set_cutoff,
+                   DATETIME_SEP)
 
 # TODO fail gracefully around some central fn
 
 
-def get_movies(theater, date, **kwargs):
-    """Get movie names and times
+D_ACTIONS = dict( # theater -> scraper name (imported on first use, see `get_scraper`)
+    # bos:
+    brattle_theatre='get_movies_brattle',
+    coolidge_corner='get_movies_coolidge',
+    harvard_film_archive='get_movies_hfa',
+    mfa_boston='get_movies_mfa',
+    kendall_cinema='get_movies_landmark',
+    somerville_theatre='get_movies_somerville',
+    amc_boston_common='get_movies_amc',
+    regal_fenway='get_movies_showtimes',
+    # nyc:
+    alamo_drafthouse_brooklyn='get_movies_alamo',
+    angelika_film_center='get_movies_village_east_or_angelika',
+    anthology='get_movies_anthology',
+    bam_rose_cinemas='get_movies_bam',
+    cinema_village='get_movies_cinema_village',
+    cobble_hill_cinemas='get_movies_cobble_hill',
+    # film_forum='get_movies_film_forum', # custom is slow - have to open headless => fall back to default
+    film_noir='get_movies_film_noir',
+    ifc='get_movies_ifc',
+    loews_jersey_theater='get_movies_loews_theater',
+    lincoln_center='get_movies_filmlinc',
+    metrograph='get_movies_metrograph',
+    moma='get_movies_moma',
+    museum_of_the_moving_image='get_movies_momi',
+    nitehawk='get_movies_nitehawk',
+    nitehawk_prospect_park='get_movies_nitehawk',
+    quad_cinema='get_movies_quad',
+    syndicated_bk='get_movies_syndicated',
+    ua_court_st='get_movies_showtimes',
+    village_east_cinema='get_movies_village_east_or_angelika',
+    #videology='get_movies_videology', # RIP
+    # pgh:
+    regent_square_theater='get_movies_pghfilmmakers',
+    harris_theater='get_movies_pghfilmmakers',
+    melwood_screening_room='get_movies_pghfilmmakers',
+    the_manor='get_movies_manor',
+    row_house_cinema='get_movies_rowhouse',
+    the_waterfront='get_movies_amc'
+)
+
+
+def get_movies_fallback(theater, date, *args, **kwargs):
+    """Get movie names and times for unlisted theater
+
+    N.B. showtimes.com is tried once google fails (or is known to be down) -- or, if hedging,
+    once google is slow (see `hedge.set_delay`)
 
     :theater: str
     :date: str (yyyy-mm-dd) (default: today)
     :returns: (list of movie names, list of lists of movie times)
     """
+    return hedge.race([
+        ('google', partial(guard, f'google:{theater}', get_scraper('get_movies_google'), theater, date, *args, **kwargs)),          # default to google search
+        ('showtimes', partial(guard, f'showtimes:{theater}', get_scraper('get_movies_showtimes'), theater, date, *args, **kwargs)), # or, last ditch effort, showtimes.com search
+    ], is_valid=lambda result: bool(result[0]))
+
+
+def get_scraper(name):
+    """Get scraper by name -- importing scrapers (& their parsing dependencies) on first use
+
+    :name: str (e.g. "get_movies_ifc")
+    :returns: function (theater, date) -> Showtimes (or parallel lists, see `to_showtimes`)
+    """
+    import scrapers # (only once -- cached in `sys.modules` thereafter)
+
+    return getattr(scrapers, name)
+
+
+def get_action(theater):
+    """Get scraper for theater
+
+    :theater: str
+    :returns: function (theater, date) -> Showtimes (or parallel lists, see `to_showtimes`)
+    """
+    name = D_ACTIONS.get(theater.lower().replace(' ', '_'))
+    return get_scraper(name) if name is not None else get_movies_fallback
+
+
+def get_movies(theater, date, **kwargs):
+    """Get showtimes -- via fallback, if theater's scraper is known to be down (see `breaker.py`)
+
+    :theater: str
+    :date: str (yyyy-mm-dd) (default: today)
+    :returns: Showtimes
+    """
     theater = theater.lower()
 
-    D_ACTIONS = dict(
-        # bos:
-        brattle_theatre=get_movies_brattle,
-        coolidge_corner=get_movies_coolidge,
-        harvard_film_archive=get_movies_hfa,
-        mfa_boston=get_movies_mfa,
-        kendall_cinema=get_movies_landmark,
-        somerville_theatre=get_movies_somerville,
-        amc_boston_common=get_movies_amc,
-        regal_fenway=get_movies_showtimes,
-        # nyc:
-        alamo_drafthouse_brooklyn=get_movies_alamo,
-        angelika_film_center=get_movies_village_east_or_angelika,
-        anthology=get_movies_anthology,
-        bam_rose_cinemas=get_movies_bam,
-        cinema_village=get_movies_cinema_village,
-        cobble_hill_cinemas=get_movies_cobble_hill,
-        # film_forum=get_movies_film_forum, # custom is slow - have to open headless => fall back to default
-        film_noir=get_movies_film_noir,
-        ifc=get_movies_ifc,
-        loews_jersey_theater=get_movies_loews_theater,
-        lincoln_center=get_movies_filmlinc,
-        metrograph=get_movies_metrograph,
-        moma=get_movies_moma,
-        museum_of_the_moving_image=get_movies_momi,
-        nitehawk=get_movies_nitehawk,
-        nitehawk_prospect_park=get_movies_nitehawk,
-        quad_cinema=get_movies_quad,
-        syndicated_bk=get_movies_syndicated,
-        ua_court_st=get_movies_showtimes,
-        village_east_cinema=get_movies_village_east_or_angelika,
-        #videology=get_movies_videology, # RIP
-        # pgh:
-        regent_square_theater=get_movies_pghfilmmakers,
-        harris_theater=get_movies_pghfilmmakers,
-        melwood_screening_room=get_movies_pghfilmmakers,
-        the_manor=get_movies_manor,
-        row_house_cinema=get_movies_rowhouse,
-        the_waterfront=get_movies_amc
-    )
-
-    def fallback(*args, **kwargs):
+    action = get_action(theater)
+    if action is not get_movies_fallback:
         try:
-            return get_movies_google(*args, **kwargs)    # default to google search
-        except(NoMoviesException):
-            return get_movies_showtimes(*args, **kwargs) # or, last ditch effort, showtimes.com search
+            return to_showtimes(guard(f'{action.__name__}:{theater}', action, theater, date))
+        except(CircuitOpen):
+            action = get_movies_fallback
+
+    return to_showtimes(action(theater, date))
+
+
+def to_showtimes(result):
+    """Scraper result -> Showtimes
+
+    :result: Showtimes (e.g. from `get_movies_amc`)
+             -- OR (list of movie names, list of lists of movie times)
+    :returns: Showtimes
+    """
+    return result if isinstance(result, Showtimes) else Showtimes.from_lists(*result)
+
+
+def get_movies_cached(theater, date, d_listings, **kwargs):
+    """Get showtimes, from fresh prefetched listings if stored -- else scrape (& store, for `--stale`)
+
+    :theater: str
+    :date: str (yyyy-mm-dd) (default: today)
+    :d_listings: store.ListingsStore
+    :returns: Showtimes
+    """
+    showtimes = d_listings.get(theater, date)
+    if showtimes is not None:
+        return showtimes.since(get_cutoff(), date) # (stored listings may be outdated)
+
+    showtimes = get_movies(theater, date, **kwargs)
+    if showtimes: # (an empty listing may well be a scraper failing softly)
+        d_listings.put(theater, date, showtimes)
+    return showtimes
+
+
+def get_changes(theater, date, showtimes, d_snapshots):
+    """Diff showtimes against last run's (& snapshot them, for next run)
+
+    :theater: str
+    :date: str (yyyy-mm-dd) (or "", if from file)
+    :showtimes: Showtimes
+    :d_snapshots: store.SnapshotStore
+    :returns: (Showtimes added, Showtimes removed) -- or None, if unchanged
+    """
+    digest = showtimes.digest()
+    if d_snapshots.get_digest(theater, date) == digest: # cheap check
+        return None
+
+    last = d_snapshots.get(theater, date)
+    if last is not None:
+        last = last.since(get_cutoff(), date) if date else last # (showtimes since past aren't news)
+        if not showtimes and last: # (likely a scraper failing softly -- keep last snapshot, for next run)
+            return None
+
+    d_snapshots.put(theater, date, showtimes, digest)
+    if last is None: # first run -- all new
+        return showtimes, Showtimes()
+
+    added, removed = showtimes.diff(last)
+    return (added, removed) if added or removed else None
+
+
+async def amap(fn, iterable, max_workers=None, callback=None):
+    """Map `fn` over `iterable` concurrently, with all requests sharing one event loop
+
+    :fn: function (e.g. `get_movies` with date bound)
+    :iterable: e.g. list of theaters
+    :max_workers: max threads for parsing (default: ThreadPoolExecutor default)
+    :callback: function (index, result), called as each result completes (e.g. to stream output)
+    :returns: list of results (in order)
+    """
+    async with fetching():
+        loop = asyncio.get_running_loop()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [loop.run_in_executor(executor, fn, x) for x in iterable]
+
+            if callback is not None:
+                for i, future in enumerate(futures):
+                    future.add_done_callback(lambda future, i=i: callback(i, future.result()))
+
+            return await asyncio.gather(*futures)
+
+
+def iter_completed(fn, iterable, max_workers=1, async_=False, timeout=None):
+    """Map `fn` over `iterable` (concurrently, if `max_workers` > 1 or `async_` or `timeout`),
+    yielding each result as soon as it completes
+
+    :fn: function (e.g. `get_movies` with date bound)
+    :iterable: e.g. list of theaters
+    :max_workers: max threads
+    :async_: share one event loop for all requests ? (see `amap`)
+    :timeout: s to wait for all results, before giving up on the rest (default: wait forever)
+    :returns: generator of (index, result), in order of completion -- w/ result None if timed out
+    """
+    xs = list(iterable)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    get_remaining = lambda: max(deadline - time.monotonic(), 0) if deadline is not None else None
 
-    action = D_ACTIONS.get(theater.replace(' ', '_'), fallback)
+    if async_: # run loop in background, handing back results as they complete
+        results = queue.Queue()
 
-    return action(theater, date)
+        def run():
+            try:
+                asyncio.run(amap(fn, xs, max_workers=(max_workers if max_workers > 1 else None),
+                                 callback=lambda i, result: results.put((i, result))))
+                results.put(None)
+            except(Exception) as e:
+                results.put(e)
+
+        threading.Thread(target=run, daemon=True).start()
+
+        pending = set(range(len(xs)))
+        try:
+            for item in iter(lambda: results.get(timeout=get_remaining()), None):
+                if isinstance(item, Exception):
+                    raise(item)
+                pending.discard(item[0])
+                yield item
+        except(queue.Empty): # out of time
+            yield from ((i, None) for i in sorted(pending))
+
+    elif max_workers > 1 or timeout is not None:
+        # N.B. daemon threads, so that any stragglers (e.g. hung sites) can't hold up exit
+        todo, results = queue.Queue(), queue.Queue()
+        for item in enumerate(xs):
+            todo.put(item)
+        n_workers = min(max_workers, len(xs) or 1)
+
+        lock = threading.Lock()
+        overdue_at = {} # index -> time its scrape's share of the deadline is up (while running)
+        replaced = set() # indices of scrapes that overran their share (see below)
+
+        def work():
+            while True:
+                try:
+                    i, x = todo.get_nowait()
+                except(queue.Empty):
+                    return
+
+                try:
+                    if deadline is None:
+                        result = fn(x)
+                    else: # split time left between scrapes not yet started (incl. this one)
+                        n_left = len(xs) - i
+                        share = get_remaining() * min(n_workers, n_left) / n_left
+                        with lock:
+                            overdue_at[i] = time.monotonic() + share
+                        with within(share):
+                            result = fn(x)
+                except(Exception) as e:
+                    result = e
+                results.put((i, result))
+
+                with lock:
+                    overdue_at.pop(i, None)
+                    if i in replaced: # (already replaced by another worker)
+                        return
+
+        def start_worker():
+            threading.Thread(target=work, daemon=True).start()
+
+        for _ in range(n_workers):
+            start_worker()
+
+        def get_wait():
+            """Time to wait for next result -- until next running scrape overruns its share, at most"""
+            with lock:
+                now = time.monotonic()
+                for i in [i for i, t in overdue_at.items() if t <= now]:
+                    # e.g. a site trickling its response, or a scrape blocking outside `fetch` --
+                    # leave it running (it may yet finish), but don't hold up the rest
+                    del overdue_at[i]
+                    replaced.add(i)
+                    start_worker()
+                next_overdue = min(overdue_at.values(), default=None)
+
+            remaining = get_remaining()
+            return (remaining if next_overdue is None else
+                    min(remaining, max(next_overdue - now, 0) + 0.01))
+
+        pending = set(range(len(xs)))
+        try:
+            while pending:
+                try:
+                    i, result = results.get(timeout=get_wait())
+                except(queue.Empty):
+                    if get_remaining() > 0: # (just checking for overruns)
+                        continue
+                    raise
+                if isinstance(result, Exception):
+                    raise(result)
+                pending.discard(i)
+                yield i, result
+        except(queue.Empty): # out of time
+            yield from ((i, None) for i in sorted(pending))
+
+    else:
+        yield from enumerate(map(fn, xs))
+
+
+def in_order(results):
+    """Reorder results by index, yielding each as soon as all before it have been
+
+    :results: iterable of (index, result), in any order (e.g. from `iter_completed`)
+    :returns: generator of (index, result), in order of index
+    """
+    pending, i_next = {}, 0
+    for i, result in results:
+        pending[i] = result
+        while i_next in pending:
+            yield i_next, pending.pop(i_next)
+            i_next += 1
 
 
 def get_movies_from_file(f, **kwargs):
     """
-    path/to/file -> list of movienames
+    path/to/file -> Showtimes (titles only)
     """
     movie_names = get_from_file(f=f)
     movie_times = [''] * len(movie_names)
 
-    return movie_names, movie_times # appropriately sized list of empty strings
+    return Showtimes.from_lists(movie_names, movie_times) # appropriately sized list of empty strings
 
 
-def print_movies(theater, movie_names, movie_times, movie_ratings=[], sorted_=False):
+def print_movies(theater, showtimes, d_ratings=None, sorted_=False):
     """Pretty-print movies
 
     :theater: str
-    :movie_names: [strs]
-    :movie_times: [strs]
-    :movie_ratings: [floats]
+    :showtimes: Showtimes
+    :d_ratings: dict {title: float} (default: no ratings)
     :sorted_: sort movies by descending rating ?
     """
-    if not movie_names: # search found no movies
+    if not showtimes: # search found no movies
         print(f'skipping {theater}...')
         return
 
-    SPACER = 2
-    SEP_CHAR = '|' if reduce(operator.add, movie_times) else '' # no SEP if no times (list of empty strs)
+    groups = list(showtimes.iter_groups()) # combined by (title, format)
+    if not groups: # (all sold out)
+        print(f'skipping {theater}...')
+        return
+
+    movie_names, movie_formats, movie_times = zip(*groups)
+    movie_ratings = ([d_ratings.get(name, -1) for name in movie_names]
+                     if d_ratings is not None else [])
 
-    PATTERN = re.compile(', \[') # match movie type in timelist
+    SPACER = 2
+    SEP_CHAR = '|' if any(movie_times) else '' # no SEP if no times (titles only)
 
     theater_space = len(theater)
     col_space = len(max(movie_names, key=len))
 
-    def to_pprint_str(name, times, rating, with_rating=True):
+    def to_pprint_str(name, fmt, times, rating, with_rating=True):
         if with_rating:
             # tuple (str, strfmt)
             t_rating_fmt = ((rating, '.0%') if rating > 0 else
@@ -114,18 +378,17 @@ def print_movies(theater, movie_names, movie_times, movie_ratings=[], sorted_=Fa
         else:
             rating_str = ''
 
-        # time_str = re.sub(PATTERN, '  [', ', '.join(times)) # reformat movie type
-        time_str = re.sub(PATTERN, '  [', ', '.join(('{:>7}'.format(t) # reformat movie type
-                                                     for t in times))) # & align time spacing
+        time_str = (', '.join('{:>7}'.format(t) for t in times) # align time spacing
+                    + (f'  [ {fmt} ]' if fmt else ''))
 
         return f'{rating_str}{name:{col_space}}{SEP_CHAR:^{SPACER * 2 + len(SEP_CHAR)}}{time_str}'
 
     with_rating = (movie_ratings != [])
     sorted_ = sorted_ and with_rating
 
-    movie_strs = [to_pprint_str(name, times, rating, with_rating=with_rating)
-                  for name, times, rating in zip_longest(
-                          movie_names, movie_times, movie_ratings)]
+    movie_strs = [to_pprint_str(name, fmt, times, rating, with_rating=with_rating)
+                  for name, fmt, times, rating in zip_longest(
+                          movie_names, movie_formats, movie_times, movie_ratings)]
     movie_strs = ([movie_str for _, movie_str in sorted(
         zip(movie_ratings, movie_strs), reverse=True)] # sort best -> worst
                   if sorted_ else movie_strs)
@@ -133,6 +396,22 @@ def print_movies(theater, movie_names, movie_times, movie_ratings=[], sorted_=Fa
     pprint_header_with_lines(theater.upper(), movie_strs)
 
 
+def print_changes(theater, date, added, removed, d_ratings=None):
+    """Print showtimes added (+) & removed (-), one per line (tab-separated)
+
+    :theater: str
+    :date: str (yyyy-mm-dd) (or "", if from file)
+    :added: Showtimes
+    :removed: Showtimes
+    :d_ratings: dict {title: float} (default: no ratings)
+    """
+    for sign, showtimes in (('+', added), ('-', removed)):
+        for showtime in showtimes:
+            rating = d_ratings.get(showtime.title, -1) if d_ratings is not None else -1
+            print('\t'.join((sign, theater, date, showtime.title, showtime.format, showtime.label,
+                             f'{rating:.0%}' if rating > 0 else '')))
+
+
 def get_parser():
     parser = argparse.ArgumentParser(description=(''))
     parser.add_argument('city and/or date', nargs='*', default=[None],
@@ -144,6 +423,38 @@ def get_parser():
                         help='sort by rating? (default: false)')
     parser.add_argument('--filter-by', type=float, default=0,
                         help='minimum rating threshold (default: 0)')
+    parser.add_argument('--rate-limit', type=float, default=None, metavar='RPS',
+                        help='max ratings API requests per second (default: 20)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of theaters to scrape concurrently (default: 1)')
+    parser.add_argument('--async', action='store_true', dest='async_',
+                        help='share one event loop for all requests? (default: false)')
+    parser.add_argument('--stream', action='store_const', const='completed',
+                        help='print each theater as soon as it is ready? (default: false)')
+    parser.add_argument('--stream-ordered', action='store_const', const='ordered', dest='stream',
+                        help='print theaters in order, each as soon as it and all before it are ready? (default: false)')
+    parser.add_argument('--hedge', type=float, default=None, metavar='SECONDS',
+                        help=('for unlisted theaters, also try showtimes.com if google is slower '
+                              'than this (0: race both) (default: only if google fails)'))
+    parser.add_argument('--deadline', type=float, default=None, metavar='SECONDS',
+                        help='give up on theaters not listed within this time (default: wait)')
+    parser.add_argument('--stale', action='store_true',
+                        help='fill in theaters that time out from their last stored listing? (default: false)')
+    parser.add_argument('--days', type=int, default=1,
+                        help='number of days to list, starting from date (default: 1)')
+    parser.add_argument('--batch', action='store_true',
+                        help='filter all listings at once, in one NumPy pass, before printing? (default: false)')
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument('--changes', action='store_true',
+                        help='only print showtimes added or removed since last run (tab-separated)? (default: false)')
+    output.add_argument('--export', choices=FORMATS, default=None, metavar='FORMAT',
+                        help=f'write one record per showtime, as {"/".join(FORMATS)}, instead of printing (default: print)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='rescrape all pages, bypassing caches? (default: false)')
+    parser.add_argument('--profile', action='store_true',
+                        help='print time spent per stage per theater, & cache stats? (default: false)')
+    parser.add_argument('--profile-json', type=str, default=None,
+                        help='path/to/profile.json (implies --profile)')
     return parser
 
 
@@ -161,6 +472,8 @@ if __name__ == '__main__':
         theaters = [moviefile.split('_')[-1]]
         moviegetter = partial(get_movies_from_file, f=moviefile)
 
+        queries = [dict(theater=theater) for theater in theaters]
+
     else:                     # from movies by city/date
 
         city_date = args.__getattribute__('city and/or date') # b/c spaces
@@ -180,42 +493,258 @@ if __name__ == '__main__':
                 theaters = get_theaters(city)
             date = maybe_city if maybe_city is not None else DATE
 
-        moviegetter = partial(get_movies, date=convert_date(date))
+        moviegetter = get_movies
+
+        # N.B. sources listing many days are only fetched once (per run)
+        queries = [dict(theater=theater, date=date)
+                   for date in get_dates(convert_date(date), args.days)
+                   for theater in theaters]
+
+    d_listings = None
+    if args.no_cache:
+        no_cache()
+    elif moviefile is None: # answer from stored listings where possible (see `prefetch.py`)
+        d_listings = ListingsStore()
+        moviegetter = partial(get_movies_cached, d_listings=d_listings)
+
+    d_snapshots = None
+    if args.changes: # diff against last run (see `get_changes`)
+        d_snapshots = SnapshotStore()
+        d_snapshots.prune(convert_date('today'))
+
+    set_cutoff() # i.e. now, for all theaters
+    set_deadline(args.deadline) # (bounds each request by time left)
+
+    if args.hedge is not None:
+        hedge.set_delay(args.hedge)
+
+    if args.profile or args.profile_json:
+        timing.enable()
 
     # do stuff
     need_ratings = args.filter_by > 0 or not args.simple
     if need_ratings:
-        d_cached = {}
-
         try:
+            import ratings
             from ratings import get_ratings
+            from store import RatingsStore
+
+            d_cached = RatingsStore()
+            if args.rate_limit is not None:
+                ratings.set_rate_limit(args.rate_limit)
         except(Exception) as e: # e.g. missing secrets
             msg, = e.args
-            print(msg + '\n\n')
+            print(msg + '\n\n', file=sys.stderr)
 
             need_ratings = False
 
-    for theater in theaters:
-        print()
+    def get_label(query):
+        """Get display name for query
 
-        movie_names, movie_times = moviegetter(theater=theater)
+        :query: dict of kwargs for `moviegetter` (theater, date)
+        :returns: str
+        """
+        return (DATETIME_SEP.join((query['theater'],
+                                   convert_date(query['date'], fmt_out='%a %-m/%-d')))
+                if args.days > 1 and 'date' in query else query['theater'])
 
-        if need_ratings:
+    def get_listing(query):
+        """Get (rated) movies for a single theater (& date), w/o letting failures propagate
+
+        :query: dict of kwargs for `moviegetter` (theater, date)
+        :returns: (list of error msgs, Showtimes, dict of ratings per title (or None))
+        """
+        theater = query['theater']
+        msgs = []
+
+        with for_theater(get_label(query)):
             try:
-                movie_ratings, d_cached = get_ratings(movie_names, d_cached)
+                with stage('scrape'):
+                    showtimes = moviegetter(**query)
+            except(DeadlineExceeded):
+                return get_timed_out(query)
+            except(Exception) as e: # e.g. site down or layout changed -- skip, but keep going
+                msgs.append(error_str.format(f'{theater} failed ({type(e).__name__})'))
+                if d_snapshots is not None: # (nothing to compare)
+                    return msgs, None, None
+                showtimes = Showtimes()
+
+            movie_names = showtimes.unique_titles()
+            if d_snapshots is not None:
+                showtimes = get_changes(theater, query.get('date', ''), showtimes, d_snapshots)
+                if showtimes is None: # unchanged -- skip rating (& rendering)
+                    return msgs, None, None
+                movie_names = list(dict.fromkeys(title for changed in showtimes
+                                                 for title in changed.unique_titles()))
+
+            d_ratings = None
+            if need_ratings and movie_names:
+                try:
+                    with stage('ratings'):
+                        movie_ratings, _ = get_ratings(movie_names, d_cached)
+                        d_ratings = dict(zip(movie_names, movie_ratings))
+
+                except(Exception) as e: # e.g. API request failed
+                    msg, *_ = e.args
+                    msgs.append(msg + '\n\n')
+
+        return msgs, showtimes, d_ratings
+
+    def get_timed_out(query):
+        """Get listing for a theater that missed the deadline -- i.e. last stored listing (if `--stale`)
+
+        :query: dict of kwargs for `moviegetter` (theater, date)
+        :returns: (list of error msgs, Showtimes (or None, if only printing changes), None)
+        """
+        theater, date = query['theater'], query.get('date')
+
+        if d_snapshots is not None: # (nothing to compare)
+            return [error_str.format(f'{theater} timed out')], None, None
+
+        last = (d_listings.get_last(theater, date)
+                if args.stale and d_listings is not None and date is not None else None)
+        if last is None:
+            return [error_str.format(f'{theater} timed out')], Showtimes(), None
+
+        showtimes, fetched_at = last
+        as_of = time.strftime('%a %-I:%M%p', time.localtime(fetched_at)).lower()
+        return ([error_str.format(f'{theater} timed out -- listing as of {as_of}')],
+                showtimes.since(get_cutoff(), date), None)
+
+    def render(query, listing, threshold=args.filter_by):
+        """Print listing for a single theater (& date)
+
+        :query: dict of kwargs for `moviegetter` (theater, date)
+        :listing: tuple (see `get_listing`)
+        :threshold: minimum rating
+        """
+        msgs, showtimes, d_ratings = listing
+        theater = get_label(query)
+        print()
+
+        for msg in msgs:
+            print(msg)
+
+        with for_theater(theater), stage('render'):
+            print_movies(theater, filter_by_rating(showtimes, d_ratings, threshold),
+                         d_ratings, sorted_=args.sorted)
+
+    def render_changes(query, listing, threshold=args.filter_by):
+        """Print changes for a single theater (& date) since last run, if any
+
+        :query: dict of kwargs for `moviegetter` (theater, date)
+        :listing: tuple (see `get_listing`)
+        :threshold: minimum rating
+        """
+        msgs, changes, d_ratings = listing
+
+        for msg in msgs:
+            print(msg, file=sys.stderr) # (stdout is only changes)
+
+        if changes is not None:
+            with for_theater(get_label(query)), stage('render'):
+                print_changes(query['theater'], query.get('date', ''),
+                              *(filter_by_rating(showtimes, d_ratings, threshold)
+                                for showtimes in changes), d_ratings)
+
+    def render_export(query, listing, threshold=args.filter_by):
+        """Write listing for a single theater (& date) as records (see `export.py`)
 
-            except(Exception) as e: # e.g. API request failed
-                msg, = e.args
-                print(msg + '\n\n')
+        :query: dict of kwargs for `moviegetter` (theater, date)
+        :listing: tuple (see `get_listing`)
+        :threshold: minimum rating
+        """
+        msgs, showtimes, d_ratings = listing
+
+        for msg in msgs:
+            print(msg, file=sys.stderr) # (stdout is only records)
+
+        with for_theater(get_label(query)), stage('render'):
+            exporter.write(query['theater'], query.get('date'),
+                           filter_by_rating(showtimes, d_ratings, threshold), d_ratings)
+
+    exporter = (get_exporter(args.export) # stream records, w/o holding on to listings
+                if args.export is not None and d_snapshots is None else None)
+    show = (render_changes if d_snapshots is not None else
+            render_export if exporter is not None else
+            render)
+
+    with run_scope(): # fetch & parse any shared pages once
+
+        executor = None
+        get_scoped = scoped(get_listing) # (sharing run's pages w/ worker threads)
+
+        if args.stream:     # print each listing as soon as it's ready
+            listings = iter_completed(get_scoped, queries, max_workers=args.jobs,
+                                      async_=args.async_, timeout=args.deadline)
+            listings = in_order(listings) if args.stream == 'ordered' else listings
+
+            for i, listing in listings:
+                show(queries[i], listing or get_timed_out(queries[i]))
+                sys.stdout.flush() # (even if piped)
 
-                movie_ratings = []
         else:
-            movie_ratings = []
-
-        print_movies(theater, *filter_by_rating(movie_names,
-                                                movie_times,
-                                                movie_ratings,
-                                                args.filter_by),
-                     sorted_=args.sorted)
-    if theaters:
+            if args.deadline is not None: # print in order of theaters, giving up on any still going
+                listings = [listing or get_timed_out(queries[i]) for i, listing in in_order(
+                    iter_completed(get_scoped, queries, max_workers=args.jobs,
+                                   async_=args.async_, timeout=args.deadline))]
+            elif args.async_:   # requests share one event loop, bounded per host
+                listings = asyncio.run(amap(get_scoped, queries,
+                                            max_workers=(args.jobs if args.jobs > 1 else None)))
+            elif args.jobs > 1: # scrape concurrently, but print in order of theaters
+                executor = ThreadPoolExecutor(max_workers=min(args.jobs, len(queries) or 1))
+                listings = executor.map(get_scoped, queries)
+            else:
+                listings = map(get_scoped, queries)
+
+            threshold = args.filter_by
+            if args.batch and show is render: # filter (& group) all listings at once (see `batch.py`)
+                try:
+                    from batch import postprocess # (numpy only imported if batching)
+                except(ImportError) as e:
+                    e.args = ('[  --batch needs numpy -- `pip install numpy`  ]',)
+                    raise(e)
+
+                listings = list(listings)
+                listings = [(msgs, showtimes, d_ratings) for (msgs, _, d_ratings), showtimes in zip(
+                    listings, postprocess([(query.get('date'), showtimes, d_ratings)
+                                           for query, (_, showtimes, d_ratings) in zip(queries, listings)],
+                                          threshold))]
+                threshold = 0 # (already filtered)
+
+            for query, listing in zip(queries, listings):
+                show(query, listing, threshold)
+
+    if exporter is not None:
+        exporter.close()
+    elif theaters and d_snapshots is None:
         print()
+
+    breakers = get_breakers()
+    if breakers is not None and breakers.stats['skipped']: # (i.e. why theaters are missing)
+        print('[ skipped {skipped} scrapers known to be down ]'.format(**breakers.stats),
+              file=sys.stderr)
+
+    if executor is not None:
+        executor.shutdown()
+
+    if args.profile or args.profile_json:
+        import sessions
+
+        if d_listings is not None:
+            print('[ listings: {hits} stored, {misses} scraped ]'.format(
+                **{k: d_listings.stats[k] for k in ('hits', 'misses')}), file=sys.stderr)
+        if need_ratings:
+            print('[ ratings: {hits} cached, {stale} stale, {misses} looked up ]'.format(
+                **{k: ratings.STATS[k] for k in ('hits', 'stale', 'misses')}), file=sys.stderr)
+
+        timing.print_report()
+        sessions.print_stats()
+        hedge.print_stats()
+    if args.profile_json:
+        timing.write_report(args.profile_json)
+
+    if args.deadline is not None: # exit w/o waiting on stragglers (e.g. hung sites) -- all output is in
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(0)
@@ -0,0 +1,127 @@
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import contextvars
+from statistics import median
+import sys
+import threading
+import time
+
+
+DELAY = None # s before starting next source, if none has won yet (None: only once previous fails)
+
+WINDOW = 256 # latest latencies kept per source (e.g. in long-running server)
+
+STATS = defaultdict(Counter) # source -> wins, losses, empty, failed, n (finished attempts)
+LATENCIES = defaultdict(lambda: deque(maxlen=WINDOW)) # source -> seconds (per recent attempt)
+
+_LOCK = threading.Lock()
+_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix='hedge')
+
+
+def set_delay(delay):
+    """Hedge sources: start next after `delay` s (0: all at once, None: only once previous fails)
+
+    :delay: float or None
+    """
+    global DELAY
+    DELAY = delay
+
+
+def record(name, key):
+    with _LOCK:
+        STATS[name][key] += 1
+
+
+def timed_call(name, fn):
+    start = time.perf_counter()
+    try:
+        return fn()
+    finally:
+        with _LOCK:
+            LATENCIES[name].append(time.perf_counter() - start)
+            STATS[name]['n'] += 1
+
+
+def race(sources, delay=None, is_valid=bool):
+    """Get first valid result from sources, started in order (& hedged after `delay`)
+
+    N.B. a source that is already running when another wins is left to finish, but ignored
+
+    :sources: list of (name, function () -> result), in order of preference
+    :delay: float (s) (default: `DELAY`)
+    :is_valid: function result -> bool (e.g. non-empty)
+    :returns: result (or last invalid result, if none valid)
+    :raises: last exception, if all sources failed
+    """
+    delay = DELAY if delay is None else delay
+
+    remaining = list(sources)
+    pending = {} # future -> name
+    invalid, error = None, None
+
+    def start_next():
+        name, fn = remaining.pop(0)
+        ctx = contextvars.copy_context() # e.g. for per-theater timing
+        pending[_EXECUTOR.submit(ctx.run, timed_call, name, fn)] = name
+
+    start_next()
+    while pending:
+        done, _ = wait(pending, timeout=(delay if remaining else None),
+                       return_when=FIRST_COMPLETED)
+        if not done: # too slow -- hedge
+            start_next()
+            continue
+
+        for future in done:
+            name = pending.pop(future)
+            try:
+                result = future.result()
+            except(Exception) as e:
+                record(name, 'failed')
+                error = e
+                continue
+
+            if not is_valid(result):
+                record(name, 'empty')
+                invalid = result
+                continue
+
+            record(name, 'wins')
+            for loser, loser_name in pending.items():
+                loser.cancel() # (if not yet started)
+                record(loser_name, 'losses')
+            return result
+
+        if not pending and remaining: # all so far failed
+            start_next()
+
+    if invalid is not None:
+        return invalid
+    raise(error)
+
+
+def get_stats():
+    """Get wins & latencies per source
+
+    :returns: dict {source: {'wins': int, .., 'median_ms': float (over last `WINDOW` attempts)}}
+    """
+    with _LOCK:
+        return {name: dict(STATS[name],
+                           median_ms=(median(LATENCIES[name]) * 1e3 if LATENCIES[name] else None))
+                for name in sorted(set(STATS) | set(LATENCIES))}
+
+
+def print_stats(file=sys.stderr):
+    """Print wins & median latency per source"""
+    d_stats = get_stats()
+    if not d_stats:
+        return
+
+    cols = ('wins', 'losses', 'empty', 'failed')
+    col_space = max(map(len, d_stats))
+    print(f'\n{"":{col_space}}  ' + ''.join(f'{col:>8}' for col in cols) + f'{"median (ms)":>14}',
+          file=file)
+    for name, d in d_stats.items():
+        median_ms = f'{d["median_ms"]:14.1f}' if d['median_ms'] is not None else f'{"-":>14}'
+        print(f'{name:{col_space}}  ' + ''.join(f'{d.get(col, 0):8}' for col in cols) + median_ms,
+              file=file)
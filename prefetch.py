@@ -0,0 +1,111 @@
+"""Prefetch listings (& ratings) for upcoming days on a staggered timetable, for `get_movies.py` to answer from
+
+$ python prefetch.py [city ..] [--days N] [--every MINUTES] [-j JOBS] [--once]
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import sys
+import time
+
+from fetch import run_scope, scoped
+from get_movies import get_movies
+from store import ListingsStore, LISTINGS_TTL
+from utils import error_str, get_cities, get_dates, get_theaters, set_cutoff
+
+
+MINUTE = 60 # s
+
+
+def prefetch(theater, date, d_listings, d_cached=None):
+    """Scrape & store listing, looking up ratings for any new titles
+
+    :theater: str
+    :date: str (yyyy-mm-dd)
+    :d_listings: store.ListingsStore
+    :d_cached: store.RatingsStore (or None, to skip ratings)
+    """
+    try:
+        showtimes = get_movies(theater, date)
+        if not showtimes: # (may well be a scraper failing softly -- don't serve for hours)
+            print(f'nothing listed for {theater} @ {date} -- not stored')
+            return
+        d_listings.put(theater, date, showtimes, prefetched=True)
+        print(f'prefetched {theater} @ {date} ({len(showtimes)} showtimes)')
+
+    except(Exception) as e: # e.g. site down -- keep going
+        print(error_str.format(f'{theater} @ {date} failed ({type(e).__name__})'))
+        return
+
+    if d_cached is not None and showtimes:
+        from ratings import get_ratings
+        try:
+            get_ratings(showtimes.unique_titles(), d_cached) # (cached, for `get_movies.py`)
+        except(Exception) as e: # e.g. API request failed
+            print(error_str.format(f'ratings for {theater} failed ({type(e).__name__})'))
+
+
+def prefetch_all(theaters, days=2, every=None, jobs=4, d_listings=None, d_cached=None):
+    """Prefetch listings for all theaters for the next `days` days, soonest first
+
+    :theaters: list of strs
+    :days: int
+    :every: int (s) to spread requests over (default: as fast as possible)
+    :jobs: number of theaters to scrape concurrently
+    :d_listings: store.ListingsStore
+    :d_cached: store.RatingsStore (or None, to skip ratings)
+    """
+    set_cutoff() # i.e. now
+
+    today = datetime.now().strftime('%Y-%m-%d')
+    d_listings.prune(today)
+
+    queries = [(theater, date) for date in get_dates(today, days) for theater in theaters]
+    gap = every / len(queries) if every and queries else 0 # stagger, rather than burst
+
+    with run_scope(), ThreadPoolExecutor(max_workers=jobs) as executor: # fetch shared pages once
+        for theater, date in queries:
+            executor.submit(scoped(prefetch), theater, date, d_listings, d_cached)
+            time.sleep(gap)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('cities', nargs='*', default=get_cities(),
+                        help='(default: all cities w/ theater lists)')
+    parser.add_argument('--days', type=int, default=2,
+                        help='number of days to prefetch, starting today (default: 2)')
+    parser.add_argument('--every', type=float, default=LISTINGS_TTL / MINUTE / 2,
+                        help=('minutes between refreshes of each listing '
+                              f'(default: {LISTINGS_TTL // MINUTE // 2})'))
+    parser.add_argument('-j', '--jobs', type=int, default=4,
+                        help='number of theaters to scrape concurrently (default: 4)')
+    parser.add_argument('--once', action='store_true',
+                        help='prefetch once, as fast as possible, then exit? (default: false)')
+    parser.add_argument('--rate-limit', type=float, default=None, metavar='RPS',
+                        help='max ratings API requests per second (default: 20)')
+    args = parser.parse_args()
+
+    theaters = list(dict.fromkeys(t for city in args.cities for t in get_theaters(city)))
+
+    d_listings = ListingsStore()
+    try:
+        import ratings # (check for secrets)
+        from store import RatingsStore
+
+        d_cached = RatingsStore()
+        if args.rate_limit is not None:
+            ratings.set_rate_limit(args.rate_limit)
+    except(Exception) as e: # e.g. missing secrets
+        msg, = e.args
+        print(msg + '\n', file=sys.stderr)
+
+        d_cached = None
+
+    while True:
+        start = time.time()
+        prefetch_all(theaters, days=args.days, every=(None if args.once else args.every * MINUTE),
+                     jobs=args.jobs, d_listings=d_listings, d_cached=d_cached)
+        if args.once:
+            break
+        time.sleep(max(0, args.every * MINUTE - (time.time() - start)))
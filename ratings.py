@@ -1,4 +1,8 @@
-import requests
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+import re
+import threading
+import time
 
 try:
     from secret import API_KEY
@@ -10,11 +14,57 @@ except(AttributeError, ImportError, ModuleNotFoundError) as e: # missing secrets
     raise(e)
 
 
+STATS = Counter() # cache hits & misses (i.e. API requests), per run
+
+_LOCK = threading.Lock()
+_IN_FLIGHT = {}   # movie name -> Future, for lookups underway (e.g. in another thread)
+
+_REFRESHER = ThreadPoolExecutor(max_workers=2) # for stale ratings
+
+MAX_CONNECTIONS = 16 # concurrent API requests
+RATE_LIMIT = 20      # API requests / s (default -- see `set_rate_limit`)
+
+
+class RateLimiter:
+    """Thread-safe token bucket, allowing bursts of up to `rate` requests"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._tokens = rate
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Block until a request is allowed"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0
+
+        if delay:
+            time.sleep(delay)
+
+
+_LIMITER = RateLimiter(RATE_LIMIT)
+_CLIENT = ThreadPoolExecutor(max_workers=MAX_CONNECTIONS)
+
+
+def set_rate_limit(rate):
+    """Set max API requests / s (e.g. `--rate-limit`), incl. retries
+
+    :rate: float
+    """
+    _LIMITER.rate = rate
+
+
 def get_ratings_per_movie(movie_name):
     """Get movie ratings (IMDb, Metacritic, Rotten Tomatoes)
 
     :movie_name: str
-    :returns: dict { ratings site: float(rating) }
+    :returns: (dict { ratings site: float(rating) }, year (int) or None if not found)
     """
     BASE_URL = 'http://www.omdbapi.com'
     PARAMS = {
@@ -32,36 +82,129 @@ def get_ratings_per_movie(movie_name):
         a, b = (float(x) for x in rating_str.replace('%', '/100').split('/'))
         return a / b
 
-    r = requests.get(BASE_URL, PARAMS)
+    # (requests & co only imported once looking up)
+    import requests
+    from sessions import get_session, RETRIES, TIMEOUT
+
+    # retry here (rather than in session), so that each retry waits its turn too
+    for attempt in range(RETRIES.total + 1):
+        if attempt:
+            time.sleep(RETRIES.backoff_factor * 2**(attempt - 1))
+        _LIMITER.wait()
+
+        try:
+            r = get_session(retries=False).get(BASE_URL, params=PARAMS, timeout=TIMEOUT)
+        except(requests.ConnectionError) as e: # (incl. connect timeouts)
+            if attempt == RETRIES.total:
+                raise(e)
+            continue
+
+        if r.status_code not in RETRIES.status_forcelist:
+            break
+
     assert r.ok, '[  Request to movie ratings API failed :(  ]'
 
     movie_json = r.json()
     # d_ratings = {d['Source']: d['Value'] for d in movie_json['Ratings']}
     # d_ratings = {d['Source']: rating2float(d['Value'])
 
+    is_found = movie_json['Response'] == 'True'
+
     d_ratings = ({d['Source']: rating2float(d['Value'])
                   for d in movie_json['Ratings']}
-                 if movie_json['Response'] == 'True' else {})
+                 if is_found else {})
+
+    year = re.match('[0-9]{4}', movie_json.get('Year', '')) if is_found else None # e.g. 2019–
+    year = int(year.group(0)) if year else None
+
+    return d_ratings, year
+
+
+def fetch_ratings(movie_name, d_cached):
+    """Get movie ratings from the API (once per movie, even if concurrently requested)
+    & cache them
+
+    :movie_name: str (lowercase)
+    :d_cached: RatingsStore
+    :returns: Future of dict { ratings site: float(rating) }
+    """
+    with _LOCK:
+        future = _IN_FLIGHT.get(movie_name)
+        if future is not None: # piggyback on lookup underway
+            STATS['hits'] += 1
+            return future
+
+        future = _IN_FLIGHT[movie_name] = Future()
+        STATS['misses'] += 1
+
+    try:
+        d_ratings, year = get_ratings_per_movie(movie_name)
+        d_cached.put(movie_name, d_ratings, year)
+        future.set_result(d_ratings)
+    except(Exception) as e:
+        future.set_exception(e)
+    finally:
+        with _LOCK:
+            del _IN_FLIGHT[movie_name]
+
+    return future
+
+
+def get_cached_ratings(movie_name, d_cached):
+    """Get movie ratings from cache, if any
+    (stale ratings are served as is, & refreshed in the background)
+
+    :movie_name: str (lowercase)
+    :d_cached: RatingsStore
+    :returns: dict { ratings site: float(rating) } or None
+    """
+    cached = d_cached.get(movie_name)
+
+    if cached is None:
+        return None
+
+    d_ratings, is_stale = cached
+    if is_stale:
+        STATS['stale'] += 1
+        _REFRESHER.submit(fetch_ratings, movie_name, d_cached)
+    else:
+        STATS['hits'] += 1
 
     return d_ratings
 
 
+def get_ratings_batch(movie_names, d_cached):
+    """Get ratings for (unique) movies -- from cache, or else concurrently from the API
+
+    :movie_names: iterable of strs (lowercase)
+    :d_cached: RatingsStore
+    :returns: dict {movie name: {ratings site: float(rating)}}
+    """
+    d_rating_ds = {movie_name: get_cached_ratings(movie_name, d_cached)
+                   for movie_name in movie_names}
+
+    d_futures = {movie_name: _CLIENT.submit(
+                     lambda name: fetch_ratings(name, d_cached).result(), movie_name)
+                 for movie_name, d_ratings in d_rating_ds.items() if d_ratings is None}
+
+    d_rating_ds.update((movie_name, future.result())
+                       for movie_name, future in d_futures.items())
+    return d_rating_ds
+
+
 def get_ratings(movie_names, d_cached):
     """Get movie ratings corresponding to movies, using cached review lookups
 
     :movie_names: [strs]
-    :d_cached: dictionary of cached ratings {'name': float(rating)}
-    :returns: (list of ratings, updated dictionary)
+    :d_cached: RatingsStore of cached ratings
+    :returns: (list of ratings, updated store)
     """
     movie_names = [m.lower() for m in movie_names] # consistency
 
-    movie_rating_ds = [d_cached.get(movie_name, # reuse if already cached
-                                    get_ratings_per_movie(movie_name))
-                       for movie_name in movie_names]
+    d_rating_ds = get_ratings_batch(dict.fromkeys(movie_names), d_cached) # each movie only once
+
     movie_ratings = [d.get('Rotten Tomatoes',                    # 1st choice review
                            d.get('Internet Movie Database', -1)) # fallbacks
-                     for d in movie_rating_ds]
-
-    d_cached.update(zip(movie_names, movie_rating_ds)) # update cache
+                     for d in (d_rating_ds[movie_name] for movie_name in movie_names)]
 
     return movie_ratings, d_cached
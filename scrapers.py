@@ -2,16 +2,72 @@ from datetime import datetime
 from itertools import chain
 import json
 import re
+import sys
 from time import sleep
 
-from bs4 import element
+from bs4 import element, SoupStrainer
 from dateutil import parser as dparser
 from more_itertools import first, split_before
 
-from CLIppy import (AttrDict, compose_query, convert_date, flatten, safe_encode,
-                    soup_me, json_me)
-from utils import (clean_time, combine_times, error_str, index_into_days,
-                   filter_movies, filter_past, NoMoviesException, DATETIME_SEP)
+from CLIppy import AttrDict, compose_query, flatten, safe_encode
+from fetch import get_cache, is_moved, soup_me, json_me
+from showtimes import to_minutes, Showtimes, NO_TIME
+from store import SlugStore
+from utils import (clean_time, combine_times, convert_date, error_str, get_cutoff, index_into_days,
+                   filter_movies, filter_past, parse_date, DateNotListed, NoMoviesException,
+                   DATETIME_SEP)
+
+
+# only parse relevant containers of heavy pages
+D_PARSE_ONLY = dict(
+    amc=SoupStrainer('div', class_='ShowtimesByTheatre-film'),
+    bam=SoupStrainer('div', {'data-sort-date': True}),
+    loews_theater=SoupStrainer('div', {'data-tribejson': True}) # (parents of event titles)
+)
+
+_SLUGS = None
+
+
+def get_slugs():
+    """Get store of resolved theater slugs (only if caching, & not using fixtures)
+
+    :returns: store.SlugStore or None
+    """
+    global _SLUGS
+
+    if get_cache() is None:
+        return None
+
+    if _SLUGS is None:
+        _SLUGS = SlugStore()
+    return _SLUGS
+
+
+def scrape_theaterpg(site, theater, lookup, scrape):
+    """Scrape unlisted theater's page, via slug looked up once & then stored --
+    revalidated (i.e. looked up again) only if stored slug's page is gone, e.g. since page moved
+    (rather than just listing no movies, e.g. late at night)
+
+    :site: str (e.g. "showtimes")
+    :theater: str
+    :lookup: function theater -> slug (via site search)
+    :scrape: function slug -> list of movies (or None if page is gone, moved, or not a theater's)
+    :returns: list of movies
+    """
+    slugs = get_slugs()
+    slug = slugs.get(site, theater) if slugs is not None else None
+
+    if slug is not None:
+        movies = scrape(slug)
+        if movies is not None:
+            return movies
+        slugs.drop(site, theater) # revalidate
+
+    fresh = lookup(theater)
+    if slugs is not None:
+        slugs.put(site, theater, fresh)
+
+    return (scrape(fresh) if fresh != slug else None) or []
 
 
 def get_movies_google(theater, date, *args, **kwargs):
@@ -58,8 +114,8 @@ def get_movies_google(theater, date, *args, **kwargs):
     except(AssertionError, AttributeError) as e:
         # print(error_str.format(e)) # error msg only
         # movies = []                # no movies found for desired theater/date
-        print(error_str.format('No matching theater on google'))
-        raise(NoMoviesException(e))
+        print(error_str.format('No matching theater on google'), file=sys.stderr)
+        raise((DateNotListed if isinstance(e, AssertionError) else NoMoviesException)(e))
 
     movie_names = [m.span.text for m in movies]
 
@@ -96,21 +152,26 @@ def get_movies_showtimes(theater, date):
     BASE_URL = 'https://www.showtimes.com/movie-theaters/{}'
 
     D_THEATERS = {
-        'regal fenway': lambda *args: 'regal-fenway-stadium-13-rpx-6269',
-        'ua court st':  lambda *args: 'ua-court-street-stadium-12-rpx-6608'
+        'regal fenway': 'regal-fenway-stadium-13-rpx-6269',
+        'ua court st':  'ua-court-street-stadium-12-rpx-6608'
     }
 
+    def scrape(slug):
+        url = BASE_URL.format(slug)
+        movies = soup_me(url)('li', class_='movie-info-box')
+        return None if not movies and is_moved(url) else movies # (i.e. 404 or redirect)
+
     try:
-        soup = soup_me(BASE_URL.format(
-            D_THEATERS.get(theater.lower(),
-                           get_theaterpg_showtimes)(theater))) # fallback for unlisted theater
-                                                               # (phrased as functions, so theaterpg scraper won't run until necessary)
+        movies = ((scrape(D_THEATERS[theater.lower()]) or []) if theater.lower() in D_THEATERS else
+                  scrape_theaterpg('showtimes', theater, get_theaterpg_showtimes, scrape)) # fallback for unlisted theater
 
-        movies = soup('li', class_='movie-info-box')
+    except(IndexError) as e: # no matching theater -- i.e. failed (see `breaker.py`)
+        print(error_str.format(e), file=sys.stderr)
+        raise(NoMoviesException(e))
 
     except(Exception) as e:
-        print(error_str.format(e)) # error msg only
-        movies = []                # no matching theater
+        print(error_str.format(e), file=sys.stderr) # error msg only (stdout may be machine-read, e.g. `--export`)
+        movies = []
 
     movie_names = [
         ''.join((re.sub('[\r\n].*', '', name.text.strip())
@@ -354,7 +415,8 @@ def get_movies_loews_theater(theater, date):
     """
     BASE_URL = 'http://loewsjersey.org/calendar/?tribe-bar-date={}'
 
-    soup = soup_me(BASE_URL.format(date[:-3])) # yyy-mm
+    soup = soup_me(BASE_URL.format(date[:-3]), # yyyy-mm
+                   parse_only=D_PARSE_ONLY['loews_theater'])
 
     movie_headers = [h for h in soup('h3', class_="tribe-events-month-event-title")
                      if h.text.lower().startswith("film screening")]
@@ -521,7 +583,7 @@ def get_movies_film_forum(theater, date):
     try:
         assert not soup.meta.attrs.get('name', '').lower() == 'robots', 'robots'
     except(AssertionError) as e:
-        print(error_str.format(e)) # error msg only
+        print(error_str.format(e), file=sys.stderr) # error msg only
         return [], []              # blocked from getting movies :(
 
     days = [d.text for d in (soup.find('div', class_='sidebar-container')
@@ -738,8 +800,8 @@ def get_movies_moma(theater, date):
 
     PATTERN = re.compile('–[0-9]*:?[0-9]*')
     movie_datetimes = [
-        (dparser.parse(re.sub(PATTERN, '', # remove any time ranges
-                              m.find('div', class_='center balance-text').text))
+        (parse_date(re.sub(PATTERN, '', # remove any time ranges
+                           m.find('div', class_='center balance-text').text))
                 .strftime(DATETIME_SEP.join(('%Y-%m-%d', '%l:%M%P')))) # yyyy-mm-dd @ hh:mm {a,p}m
         for m in relevant_movies
     ]
@@ -1031,11 +1093,11 @@ def get_movies_landmark(theater, date):
 
 
 def get_movies_amc(theater, date):
-    """Get movie names and times from AMC's website
+    """Get showtimes from AMC's website
 
     :theater: str
     :date: str (yyyy-mm-dd) (default: today)
-    :returns: (list of movie names, list of lists of movie times)
+    :returns: Showtimes
     """
     BASE_URL = 'https://www.amctheatres.com/movie-theatres/{}/{}/showtimes/all/{}/{}/all'
 
@@ -1045,40 +1107,26 @@ def get_movies_amc(theater, date):
     }
     theaterplace, theatername = D_THEATERS[theater.lower()]
 
-    soup = soup_me(BASE_URL.format(theaterplace, theatername, date, theatername))
+    soup = soup_me(BASE_URL.format(theaterplace, theatername, date, theatername),
+                   parse_only=D_PARSE_ONLY['amc'])
 
-    movies = soup('div', class_='ShowtimesByTheatre-film')
+    showtimes = Showtimes() # (combined by (title, format) downstream, see `Showtimes.group`)
 
-    movie_names = [m.h2.text for m in movies] #soup('h2')]
+    for m in soup('div', class_='ShowtimesByTheatre-film'):
+        title = m.h2.text
 
-    movie_datetimes = [
-        [[DATETIME_SEP.join((date, clean_time(time.text)))
-          for time in times('div', class_='Showtime')
-          if not time.find('div', {'aria-hidden':"true"}).text == 'Sold Out']
-        # TODO print sold-out times as xed-out ?
-         for times in m(
-             'div', class_=re.compile('^Showtimes-Section Showtimes-Section'))]
-        for m in movies]
+        for fmt, times in zip((fmt.text for fmt in m('h4')), # one section per format
+                              m('div', class_=re.compile('^Showtimes-Section Showtimes-Section'))):
+            fmt = '' if fmt == 'Digital' else fmt
 
-    # flatten timelists for movies with multiple formats
-    # TODO sometimes lists separate times for same format -- combine ?
-    n_timelists_per_movie = [len(timelsts) for timelsts in movie_datetimes]
-    movie_names = list(chain.from_iterable(
-        [name] * n for name, n in zip(movie_names, n_timelists_per_movie)))
-    movie_datetimes = flatten(movie_datetimes)
+            for time in times('div', class_='Showtime'):
+                t = clean_time(time.text)
+                start = to_minutes(t)
+                showtimes.append(title, start, fmt,
+                                 sold_out=(time.find('div', {'aria-hidden':"true"}).text == 'Sold Out'),
+                                 label=(t.strip() if start == NO_TIME else None))
 
-    movie_times = filter_past(movie_datetimes)
-
-    # annotate with format
-    movie_formats = [[fmt.text for fmt in m('h4')] for m in movies]
-    movie_times = [(times if fmt == 'Digital' or not times else
-                    times + [f'[ {fmt} ]'])
-                   for times, fmt in zip(movie_times, flatten(movie_formats))]
-
-    # movie_names, movie_times = combine_times(*filter_movies(movie_names, movie_times)) # TODO combine does not know formats
-    movie_names, movie_times = filter_movies(movie_names, movie_times)
-
-    return movie_names, movie_times
+    return showtimes.since(get_cutoff(), date)
 
 
 def get_movies_nitehawk(theater, date):
@@ -1166,7 +1214,7 @@ def get_movies_bam(theater, date):
     """
     BASE_URL = 'https://www.bam.org/Filmsection'
 
-    soup = soup_me(BASE_URL)
+    soup = soup_me(BASE_URL, parse_only=D_PARSE_ONLY['bam'])
 
     relevant_movies = soup('div', {'data-sort-date': re.compile('^{}'.format(
                                       date.replace('-', '')))})
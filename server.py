@@ -0,0 +1,264 @@
+"""Serve listings as JSON, keeping scrapers, sessions & caches warm between queries
+
+$ python server.py [--port 8000] [-j JOBS] [--ttl MINUTES] [--refresh MINUTES]
+$ curl 'localhost:8000/movies?city=nyc&date=tomorrow'
+"""
+import argparse
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from CLIppy import convert_date
+
+from fetch import run_scope, scoped
+from get_movies import get_movies
+from showtimes import Showtimes
+from utils import filter_by_rating, get_cutoff, get_theaters, set_cutoff
+
+
+CITY = 'nyc'
+DATE = 'today'
+
+MINUTE = 60 # s
+
+
+class ListingsCache:
+    """In-memory LRU of listings per (city, date), tracking which are hot"""
+
+    def __init__(self, max_entries=32, ttl=10 * MINUTE):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = Counter() # (city, date) -> requests, decayed (see `get_hot`)
+
+        self._entries = OrderedDict() # (city, date) -> (fetched_at, listings)
+        self._in_flight = {}          # (city, date) -> Future
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        """Get fresh listings, computing them (once) if missing or expired
+
+        :key: (city, date)
+        :compute: function key -> listings
+        :returns: listings
+        """
+        with self._lock:
+            self.hits[key] += 1
+
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        return self.refresh(key, compute)
+
+    def refresh(self, key, compute):
+        """(Re)compute listings, sharing any computation already underway
+
+        :key: (city, date)
+        :compute: function key -> listings
+        :returns: listings
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self._in_flight[key] = Future()
+
+        if not is_owner:
+            return future.result()
+
+        try:
+            listings = compute(key)
+            future.set_result(listings)
+        except(Exception) as e:
+            future.set_exception(e)
+            raise(e)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+        with self._lock:
+            self._entries[key] = (time.time(), listings)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries: # evict least recently used
+                self._entries.popitem(last=False)
+
+        return listings
+
+    def get_hot(self, n=8):
+        """Get most requested keys since last call (& decay counts)
+
+        :n: int
+        :returns: list of (city, date)
+        """
+        with self._lock:
+            hot = [key for key, _ in self.hits.most_common(n)]
+            self.hits = Counter({key: count // 2 for key, count in self.hits.items()
+                                 if count > 1})
+        return hot
+
+
+class Server:
+    """Long-running listings service"""
+
+    def __init__(self, jobs=8, ttl=10 * MINUTE, max_entries=32):
+        self.executor = ThreadPoolExecutor(max_workers=jobs)
+        self.cache = ListingsCache(max_entries=max_entries, ttl=ttl)
+
+        try:
+            import ratings
+            from store import RatingsStore
+
+            self.ratings = ratings
+            self.d_cached = RatingsStore()
+        except(Exception) as e: # e.g. missing secrets
+            msg, = e.args
+            print(msg + '\n', file=sys.stderr)
+
+            self.ratings = None
+
+    def get_listing(self, theater, date):
+        """Get (rated) movies for a single theater & date
+
+        :theater: str
+        :date: str (yyyy-mm-dd)
+        :returns: (theater, Showtimes, dict of ratings per title (or None), error str (or None))
+        """
+        try:
+            showtimes = get_movies(theater, date)
+        except(Exception) as e: # e.g. site down or layout changed -- skip, but keep going
+            return theater, Showtimes(), None, f'{theater} failed ({type(e).__name__})'
+
+        d_ratings = None
+        if self.ratings is not None and showtimes:
+            try:
+                movie_names = showtimes.unique_titles()
+                movie_ratings, _ = self.ratings.get_ratings(movie_names, self.d_cached)
+                d_ratings = dict(zip(movie_names, movie_ratings))
+            except(Exception) as e: # e.g. API request failed
+                return theater, showtimes, None, f'ratings failed ({type(e).__name__})'
+
+        return theater, showtimes, d_ratings, None
+
+    def compute(self, key):
+        """Scrape all theaters in city for date
+
+        :key: (city, date)
+        :returns: list of (theater, Showtimes, dict of ratings, error)
+        """
+        city, date = key
+        set_cutoff() # i.e. now
+
+        with run_scope(): # fetch & parse any shared pages once (per compute)
+            get_listing = scoped(self.get_listing)
+            return list(self.executor.map(lambda theater: get_listing(theater, date),
+                                          get_theaters(city)))
+
+    def query(self, city=CITY, date=DATE, threshold=0):
+        """Get listings for city & date, as json-able dict
+
+        :city: str
+        :date: str (e.g. "tomorrow")
+        :threshold: float [0, 1] or % (1, 100]
+        :returns: dict
+        """
+        date = convert_date(date)
+        listings = self.cache.get((city, date), self.compute)
+
+        set_cutoff() # i.e. now -- cached listings may include showtimes since past
+        filtered = [filter_by_rating(showtimes.since(get_cutoff(), date), d_ratings, threshold)
+                    for _, showtimes, d_ratings, _ in listings]
+
+        return dict(city=city, date=date, theaters=[
+            dict(theater=theater, error=error, movies=to_json(showtimes, d_ratings))
+            for (theater, _, d_ratings, error), showtimes in zip(listings, filtered)])
+
+    def refresh_hot(self, every=5 * MINUTE, n=8):
+        """Keep most requested (city, date)s warm, forever
+
+        :every: int (s)
+        :n: max keys to refresh per round
+        """
+        while True:
+            time.sleep(every)
+            for key in self.cache.get_hot(n):
+                try:
+                    self.cache.refresh(key, self.compute)
+                except(Exception) as e:
+                    print(f'[ refreshing {key} failed ({type(e).__name__}) ]', file=sys.stderr)
+
+
+def to_json(showtimes, d_ratings=None):
+    """Showtimes -> list of dicts, combined by (title, format)
+
+    :showtimes: Showtimes
+    :d_ratings: dict {title: float} (or None)
+    :returns: list of dicts
+    """
+    return [dict(title=title, format=fmt or None,
+                 rating=(d_ratings.get(title, -1) if d_ratings is not None else None),
+                 times=[showtime.label for showtime in map(showtimes.__getitem__, idxs)
+                        if showtime.label])
+            for (title, fmt), idxs in showtimes.group().items()]
+
+
+def get_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+
+        def send_json(self, status, d):
+            body = json.dumps(d).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != '/movies':
+                return self.send_json(404, dict(error=f'not found: {url.path}'))
+
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                city = params.get('city', CITY)
+                get_theaters(city) # (validate)
+                date = convert_date(params.get('date', DATE))
+                threshold = float(params.get('filter_by', 0))
+            except(Exception) as e: # e.g. unknown city or unparseable date
+                return self.send_json(400, dict(error=f'bad query ({type(e).__name__})'))
+
+            self.send_json(200, server.query(city, date, threshold))
+
+    return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('-j', '--jobs', type=int, default=8,
+                        help='number of theaters to scrape concurrently (default: 8)')
+    parser.add_argument('--ttl', type=float, default=10,
+                        help='minutes to serve listings before rescraping (default: 10)')
+    parser.add_argument('--refresh', type=float, default=5,
+                        help='minutes between background refreshes of hot queries (default: 5)')
+    parser.add_argument('--max-entries', type=int, default=32,
+                        help='max (city, date)s kept in memory (default: 32)')
+    args = parser.parse_args()
+
+    server = Server(jobs=args.jobs, ttl=args.ttl * MINUTE, max_entries=args.max_entries)
+    threading.Thread(target=server.refresh_hot, kwargs=dict(every=args.refresh * MINUTE),
+                     daemon=True).start()
+
+    httpd = ThreadingHTTPServer((args.host, args.port), get_handler(server))
+    print(f'serving on http://{args.host}:{args.port}/movies?city={CITY}&date={DATE}',
+          file=sys.stderr)
+    try:
+        httpd.serve_forever()
+    except(KeyboardInterrupt):
+        httpd.server_close()
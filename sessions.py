@@ -0,0 +1,130 @@
+from collections import Counter, defaultdict
+import sys
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.request import ACCEPT_ENCODING # i.e. gzip & deflate (& br, if decodable)
+from urllib3.util.retry import Retry
+
+
+POOL_HOSTS = 64       # hosts to keep connections open to (i.e. all theaters' sites)
+POOL_PER_HOST = 16    # max open connections per host (e.g. for ratings API)
+TIMEOUT = (3.05, 30)  # s (connect, read)
+RETRIES = Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504))
+
+STATS = defaultdict(Counter) # host -> requests & connections opened
+
+_LOCK = threading.Lock()
+_SESSIONS = {} # w/ retries (or not) -> session
+
+
+def count(host, key):
+    with _LOCK:
+        STATS[host][key] += 1
+
+
+class MeteredHTTPConnection(HTTPConnection):
+    def connect(self):
+        count(self.host, 'connections') # (incl. reconnects, e.g. if server closed connection)
+        return super().connect()
+
+
+class MeteredHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        count(self.host, 'connections')
+        return super().connect()
+
+
+class MeteredHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = MeteredHTTPConnection
+
+
+class MeteredHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = MeteredHTTPSConnection
+
+
+class MeteredAdapter(HTTPAdapter):
+    """Pooled adapter, counting requests & new connections per host"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': MeteredHTTPConnectionPool,
+                                                   'https': MeteredHTTPSConnectionPool}
+
+    def send(self, request, *args, **kwargs):
+        count(urlparse(request.url).hostname, 'requests')
+        return super().send(request, *args, **kwargs)
+
+
+def get_session(retries=True):
+    """Get process-wide session, keeping connections alive per host
+
+    :retries: retry failed requests (see `RETRIES`) ? -- e.g. not if bounded by a deadline,
+              since each retry gets a full timeout of its own
+    :returns: requests.Session (thread-safe for GETs)
+    """
+    with _LOCK:
+        session = _SESSIONS.get(retries)
+        if session is None:
+            session = requests.Session()
+            adapter = MeteredAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_PER_HOST,
+                                     max_retries=(RETRIES if retries else 0))
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+
+            _SESSIONS[retries] = session
+
+    return session
+
+
+def get_trace_config():
+    """Count requests & new connections per host, for `aiohttp.ClientSession(trace_configs=..)`
+
+    :returns: aiohttp.TraceConfig
+    """
+    import aiohttp
+
+    async def on_request_start(session, ctx, params):
+        count(params.url.host, 'requests')
+
+    async def on_connection_create_end(session, ctx, params):
+        ctx.new_connection = True
+
+    async def on_request_end(session, ctx, params):
+        if getattr(ctx, 'new_connection', False):
+            count(params.url.host, 'connections')
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_request_end.append(on_request_end)
+    return trace_config
+
+
+def get_stats():
+    """Get requests & connections per host
+
+    :returns: dict {host: {'requests': int, 'connections': int, 'reused': int}}
+    """
+    with _LOCK:
+        return {host: dict(requests=d['requests'], connections=d['connections'],
+                           reused=max(d['requests'] - d['connections'], 0))
+                for host, d in STATS.items()}
+
+
+def print_stats(file=sys.stderr):
+    """Print connection reuse per host (busiest first)"""
+    d_stats = get_stats()
+    if not d_stats:
+        return
+
+    col_space = max(map(len, d_stats))
+    print(f'\n{"":{col_space}}  {"requests":>10}{"connections":>13}{"reused":>10}', file=file)
+    for host, d in sorted(d_stats.items(), key=lambda kv: -kv[1]['requests']):
+        print(f'{host:{col_space}}  {d["requests"]:10}{d["connections"]:13}{d["reused"]:10}',
+              file=file)
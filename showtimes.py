@@ -0,0 +1,245 @@
+from array import array
+from datetime import datetime
+from functools import lru_cache
+import hashlib
+import json
+import re
+import sys
+from typing import NamedTuple
+
+
+NO_TIME = -1 # e.g. title only (from file), or unparseable time (see labels)
+
+PATTERN_FMT = re.compile(r'^\[ (.*) \]$')                          # whole-movie annotation, e.g. "[ 35mm ]"
+PATTERN_TIME_FMT = re.compile(r'^(.*[^ ]) +\[ (.*) \]$')            # per-showtime annotation, e.g. "7:00pm [ q&a ]"
+PATTERN_TIME = re.compile(r'^ *([0-9]{1,2})(?::([0-9]{2}))? *([ap])\.?m\.? *$', re.I) # e.g. 7:00pm
+
+
+def to_minutes(t):
+    """Time str -> minute of day
+
+    :t: str (e.g. "7:00pm")
+    :returns: int (or NO_TIME if unparseable)
+    """
+    m = PATTERN_TIME.match(t)
+    if m is None:
+        return NO_TIME
+
+    hour, minute, ampm = m.groups()
+    return ((int(hour) % 12 + (12 if ampm.lower() == 'p' else 0)) * 60
+            + int(minute or 0))
+
+
+@lru_cache(maxsize=None) # (at most 1440)
+def from_minutes(minutes):
+    """Minute of day -> time str
+
+    :minutes: int
+    :returns: str (e.g. "7:00pm")
+    """
+    hour, minute = divmod(minutes, 60)
+    return '{}:{:02d}{}'.format((hour - 1) % 12 + 1, minute, 'pm' if hour >= 12 else 'am')
+
+
+class Showtime(NamedTuple): # (slotted)
+    title: str
+    start: int       # minute of day (or NO_TIME)
+    format: str      # '' if standard
+    sold_out: bool
+    label: str       # as displayed
+
+
+class Showtimes:
+    """Showtimes for a theater (& date), stored column-wise"""
+
+    __slots__ = ('titles', 'starts', 'formats', 'sold_out', 'labels', '_groups')
+
+    def __init__(self):
+        self.titles = []           # (interned) strs
+        self.starts = array('h')   # minutes of day
+        self.formats = []          # (interned) strs
+        self.sold_out = array('b')
+        self.labels = {}           # index -> str, only for unparseable times
+        self._groups = None        # (see `group`)
+
+    def append(self, title, start, fmt='', sold_out=False, label=None):
+        if label is not None:
+            self.labels[len(self.titles)] = label
+
+        self._groups = None
+
+        self.titles.append(sys.intern(str(title))) # (e.g. bs4.NavigableString, from scrapers)
+        self.starts.append(start)
+        self.formats.append(sys.intern(str(fmt)))
+        self.sold_out.append(sold_out)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __getitem__(self, i):
+        start = self.starts[i]
+        return Showtime(self.titles[i], start, self.formats[i], bool(self.sold_out[i]),
+                        self.labels.get(i, from_minutes(start) if start != NO_TIME else ''))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    @classmethod
+    def from_lists(cls, movie_names, movie_times):
+        """Parallel lists (as returned by scrapers) -> Showtimes
+
+        N.B. format annotations apply to the times since the last annotation -- e.g. once
+        combined, ["7:00pm", "[ 35mm ]", "9:30pm", "[ DCP ]"] is 7:00pm in 35mm & 9:30pm in DCP
+
+        :movie_names: [strs]
+        :movie_times: [[strs]], incl. any format annotations (e.g. "[ 35mm ]")
+                      -- OR [strs], e.g. empty strs for titles only (from file)
+        :returns: Showtimes
+        """
+        showtimes = cls()
+
+        def append_all(name, pending, movie_fmt=''):
+            for t, fmt in pending:
+                start = to_minutes(t)
+                showtimes.append(name, start, ', '.join(f for f in (movie_fmt, fmt) if f),
+                                 label=(t.strip() if start == NO_TIME else None))
+
+        for name, times in zip(movie_names, movie_times):
+            if not isinstance(times, list) or not times: # title only
+                showtimes.append(name, NO_TIME, label='')
+                continue
+
+            pending = [] # (time, per-showtime format) since last annotation
+            for t in times:
+                m = PATTERN_FMT.match(t)
+                if m:
+                    append_all(name, pending, m.group(1))
+                    pending = []
+                    continue
+
+                m = PATTERN_TIME_FMT.match(t) # per-showtime format
+                pending.append(m.groups() if m else (t, ''))
+
+            append_all(name, pending) # (unannotated)
+
+        return showtimes
+
+    def group(self):
+        """Group showtimes by (title, format), in order of first appearance (memoized)
+
+        :returns: dict {(title, format): sequence of indices}
+        """
+        if self._groups is None:
+            d_groups = {}
+            for i, key in enumerate(zip(self.titles, self.formats)):
+                d_groups.setdefault(key, []).append(i)
+            self._groups = d_groups
+        return self._groups
+
+    def set_groups(self, d_groups):
+        """Prime `group`, e.g. as computed for a whole batch (see `batch.ShowtimesBatch`)
+
+        :d_groups: dict {(title, format): sequence of indices}
+        """
+        self._groups = d_groups
+
+    def iter_groups(self, sold_out=False):
+        """Times per (title, format), in order of first appearance
+
+        :sold_out: include sold-out showtimes ?
+        :yields: (title, format, list of time strs)
+        """
+        for (title, fmt), idxs in self.group().items():
+            times = [self.labels[i] if i in self.labels else from_minutes(self.starts[i])
+                     for i in idxs if sold_out or not self.sold_out[i]]
+            if not times: # (all sold out)
+                continue
+            yield title, fmt, [t for t in times if t] # (e.g. title only)
+
+    def since(self, cutoff, date):
+        """Filter showtimes before cutoff
+
+        :cutoff: datetime
+        :date: str (yyyy-mm-dd) of listing
+        :returns: Showtimes
+        """
+        days_ahead = (datetime.strptime(date, '%Y-%m-%d').date() - cutoff.date()).days
+        cutoff_minutes = cutoff.hour * 60 + cutoff.minute - days_ahead * 24 * 60
+
+        if min((start for start in self.starts if start != NO_TIME),
+               default=cutoff_minutes) >= cutoff_minutes: # nothing past
+            return self
+
+        return self.take(i for i, start in enumerate(self.starts)
+                         if start == NO_TIME or start >= cutoff_minutes)
+
+    def to_dict(self):
+        """:returns: json-able dict (see `from_dict`)"""
+        return dict(titles=self.titles, starts=self.starts.tolist(), formats=self.formats,
+                    sold_out=self.sold_out.tolist(), labels=list(self.labels.items()))
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        :d: dict (see `to_dict`)
+        :returns: Showtimes
+        """
+        showtimes = cls()
+        showtimes.titles = list(map(sys.intern, d['titles']))
+        showtimes.starts = array('h', d['starts'])
+        showtimes.formats = list(map(sys.intern, d['formats']))
+        showtimes.sold_out = array('b', d['sold_out'])
+        showtimes.labels = dict(d['labels'])
+        return showtimes
+
+    def unique_titles(self):
+        """:returns: list of titles (in order)"""
+        return list(dict.fromkeys(self.titles))
+
+    def take(self, idxs):
+        """Subset (& reorder) by index
+
+        :idxs: iterable of ints
+        :returns: Showtimes
+        """
+        idxs = list(idxs)
+
+        showtimes = Showtimes() # (column-wise)
+        showtimes.titles = [self.titles[i] for i in idxs]
+        showtimes.starts = array('h', [self.starts[i] for i in idxs])
+        showtimes.formats = [self.formats[i] for i in idxs]
+        showtimes.sold_out = array('b', [self.sold_out[i] for i in idxs])
+        showtimes.labels = ({j: self.labels[i] for j, i in enumerate(idxs) if i in self.labels}
+                            if self.labels else {})
+        return showtimes
+
+    def keys(self):
+        """:returns: list of (title, format, time) per showtime -- identifying it, e.g. across runs"""
+        return [(showtime.title, showtime.format, showtime.label) for showtime in self]
+
+    def digest(self):
+        """Hash content, regardless of order (e.g. to tell if listing changed since last run)
+
+        :returns: str
+        """
+        return hashlib.sha1(json.dumps(sorted(self.keys())).encode()).hexdigest()
+
+    def diff(self, other):
+        """Showtimes added & removed since other
+
+        :other: Showtimes (e.g. last run's)
+        :returns: (Showtimes added, Showtimes removed)
+        """
+        keys, other_keys = self.keys(), other.keys()
+        new, old = set(keys), set(other_keys)
+
+        return (self.take(i for i, key in enumerate(keys) if key not in old),
+                other.take(i for i, key in enumerate(other_keys) if key not in new))
+
+    def select(self, titles):
+        """Filter by titles
+
+        :titles: set of strs
+        :returns: Showtimes
+        """
+        return self.take(i for i, title in enumerate(self.titles) if title in titles)
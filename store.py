@@ -0,0 +1,316 @@
+from collections import Counter
+from datetime import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from showtimes import Showtimes
+from utils import CACHE_DIR
+
+
+HOUR = 60 * 60 # s
+DAY = 24 * HOUR
+
+LISTINGS_TTL = 2 * HOUR # i.e. prefetched at least this often (see `prefetch.py`)
+SLUGS_TTL = 30 * DAY    # theater pages rarely move -- but do, e.g. when renovated & renamed
+
+
+def ratings_ttl(year):
+    """Get time-to-live for a movie's ratings -- the older the film, the more settled
+
+    :year: int (or None, if movie not found by ratings API)
+    :returns: int (s)
+    """
+    if year is None: # negative result
+        return 3 * DAY
+
+    age = datetime.now().year - year
+    return (90 * DAY if age >= 2 else # repertory
+            7 * DAY if age == 1 else
+            1 * DAY)                  # new release -- ratings still moving
+
+
+class SQLiteStore:
+    """Persistent (SQLite) store, shareable across threads"""
+
+    SCHEMA = None
+
+    def __init__(self, path):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False) # (guarded by lock)
+        with self._lock, self._db:
+            self._db.execute(self.SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class RatingsStore(SQLiteStore):
+    """Persistent (SQLite) store of movie ratings, with per-entry TTLs"""
+
+    SCHEMA = '''CREATE TABLE IF NOT EXISTS ratings (
+                    name TEXT PRIMARY KEY,
+                    ratings TEXT NOT NULL,
+                    year INTEGER,
+                    fetched_at REAL NOT NULL)'''
+
+    def __init__(self, path=os.path.join(CACHE_DIR, 'ratings.db')):
+        super().__init__(path)
+
+    def get(self, movie_name):
+        """Get cached ratings, if any
+
+        :movie_name: str (lowercase)
+        :returns: (dict { ratings site: float(rating) }, is stale ?) or None
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT ratings, year, fetched_at FROM ratings WHERE name = ?',
+                (movie_name,)).fetchone()
+        if row is None:
+            return None
+
+        ratings, year, fetched_at = row
+        is_stale = time.time() - fetched_at > ratings_ttl(year)
+
+        return json.loads(ratings), is_stale
+
+    def put(self, movie_name, d_ratings, year=None):
+        """Cache ratings (including negative results, i.e. movie not found)
+
+        :movie_name: str (lowercase)
+        :d_ratings: dict { ratings site: float(rating) }
+        :year: int (or None, if not found)
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO ratings VALUES (?, ?, ?, ?)',
+                (movie_name, json.dumps(d_ratings), year, time.time()))
+
+    def __contains__(self, movie_name):
+        return self.get(movie_name) is not None
+
+    def __len__(self):
+        with self._lock:
+            n, = self._db.execute('SELECT COUNT(*) FROM ratings').fetchone()
+        return n
+
+
+class ListingsStore(SQLiteStore):
+    """Persistent (SQLite) store of scraped listings, per theater & date"""
+
+    SCHEMA = '''CREATE TABLE IF NOT EXISTS listings (
+                    theater TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    showtimes TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    prefetched INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (theater, date))'''
+
+    def __init__(self, path=os.path.join(CACHE_DIR, 'listings.db'), ttl=LISTINGS_TTL):
+        super().__init__(path)
+        self.ttl = ttl
+        self.stats = Counter() # hits & misses
+
+        with self._lock, self._db:
+            try: # (stores from before `prefetched`)
+                self._db.execute('ALTER TABLE listings ADD COLUMN prefetched INTEGER NOT NULL DEFAULT 0')
+            except(sqlite3.OperationalError): # already there
+                pass
+
+    def get(self, theater, date):
+        """Get prefetched listing, if fresh
+
+        N.B. listings stored by interactive runs aren't served (only kept for `get_last`) --
+        re-scraping them goes through the response cache, w/ each source's own TTL
+
+        :theater: str
+        :date: str (yyyy-mm-dd)
+        :returns: Showtimes or None
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT showtimes, fetched_at FROM listings '
+                'WHERE theater = ? AND date = ? AND prefetched',
+                (theater.lower(), date)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['hits'] += 1
+        return Showtimes.from_dict(json.loads(row[0]))
+
+    def get_last(self, theater, date):
+        """Get last stored listing, however old
+
+        :theater: str
+        :date: str (yyyy-mm-dd)
+        :returns: (Showtimes, time fetched (s since epoch)) or None
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT showtimes, fetched_at FROM listings WHERE theater = ? AND date = ?',
+                (theater.lower(), date)).fetchone()
+        if row is None:
+            return None
+
+        showtimes, fetched_at = row
+        return Showtimes.from_dict(json.loads(showtimes)), fetched_at
+
+    def put(self, theater, date, showtimes, prefetched=False):
+        """Store listing
+
+        :theater: str
+        :date: str (yyyy-mm-dd)
+        :showtimes: Showtimes
+        :prefetched: bool (i.e. by `prefetch.py` -- else only kept for `get_last`)
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?, ?)',
+                (theater.lower(), date, json.dumps(showtimes.to_dict()), time.time(),
+                 int(prefetched)))
+
+    def prune(self, date):
+        """Drop listings before date
+
+        :date: str (yyyy-mm-dd)
+        """
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM listings WHERE date < ?', (date,))
+
+    def __len__(self):
+        with self._lock:
+            n, = self._db.execute('SELECT COUNT(*) FROM listings').fetchone()
+        return n
+
+
+class SnapshotStore(SQLiteStore):
+    """Persistent (SQLite) store of last run's listings, per theater & date, with content hashes"""
+
+    SCHEMA = '''CREATE TABLE IF NOT EXISTS snapshots (
+                    theater TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    showtimes TEXT NOT NULL,
+                    taken_at REAL NOT NULL,
+                    PRIMARY KEY (theater, date))'''
+
+    def __init__(self, path=os.path.join(CACHE_DIR, 'snapshots.db')):
+        super().__init__(path)
+
+    def get_digest(self, theater, date):
+        """Get hash of last snapshot, if any (w/o loading it)
+
+        :theater: str
+        :date: str (yyyy-mm-dd)
+        :returns: str or None
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT digest FROM snapshots WHERE theater = ? AND date = ?',
+                (theater.lower(), date)).fetchone()
+        return row[0] if row is not None else None
+
+    def get(self, theater, date):
+        """Get last snapshot, if any
+
+        :theater: str
+        :date: str (yyyy-mm-dd)
+        :returns: Showtimes or None
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT showtimes FROM snapshots WHERE theater = ? AND date = ?',
+                (theater.lower(), date)).fetchone()
+        return Showtimes.from_dict(json.loads(row[0])) if row is not None else None
+
+    def put(self, theater, date, showtimes, digest=None):
+        """Store snapshot
+
+        :theater: str
+        :date: str (yyyy-mm-dd)
+        :showtimes: Showtimes
+        :digest: str (default: `showtimes.digest()`)
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)',
+                (theater.lower(), date, digest or showtimes.digest(),
+                 json.dumps(showtimes.to_dict()), time.time()))
+
+    def prune(self, date):
+        """Drop snapshots before date
+
+        :date: str (yyyy-mm-dd)
+        """
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM snapshots WHERE date < ? AND date != ''", # (keep titles from file)
+                             (date,))
+
+
+class SlugStore(SQLiteStore):
+    """Persistent (SQLite) store of theaters' resolved URL slugs, per site"""
+
+    SCHEMA = '''CREATE TABLE IF NOT EXISTS slugs (
+                    site TEXT NOT NULL,
+                    theater TEXT NOT NULL,
+                    slug TEXT NOT NULL,
+                    resolved_at REAL NOT NULL,
+                    PRIMARY KEY (site, theater))'''
+
+    def __init__(self, path=os.path.join(CACHE_DIR, 'slugs.db'), ttl=SLUGS_TTL):
+        super().__init__(path)
+        self.ttl = ttl
+        self.stats = Counter() # hits & misses
+
+    def get(self, site, theater):
+        """Get resolved slug, if fresh
+
+        :site: str (e.g. "showtimes")
+        :theater: str
+        :returns: slug (json-able, e.g. str or list of strs) or None
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT slug, resolved_at FROM slugs WHERE site = ? AND theater = ?',
+                (site, theater.lower())).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['hits'] += 1
+        return json.loads(row[0])
+
+    def put(self, site, theater, slug):
+        """Store resolved slug
+
+        :site: str
+        :theater: str
+        :slug: json-able
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO slugs VALUES (?, ?, ?, ?)',
+                (site, theater.lower(), json.dumps(slug), time.time()))
+
+    def drop(self, site, theater):
+        """Forget slug (e.g. if theater page moved)
+
+        :site: str
+        :theater: str
+        """
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM slugs WHERE site = ? AND theater = ?',
+                             (site, theater.lower()))
+
+    def __len__(self):
+        with self._lock:
+            n, = self._db.execute('SELECT COUNT(*) FROM slugs').fetchone()
+        return n
@@ -0,0 +1,40 @@
+from showtimes import Showtimes, NO_TIME
+
+
+def test_from_lists_formats_by_position():
+    # i.e. as combined by `utils.combine_times`, each annotation following its times
+    showtimes = Showtimes.from_lists(['Vertigo', 'Alien'],
+                                     [['7:00pm', '[ 35mm ]', '9:30pm', '[ DCP ]'],
+                                      ['1:00pm', '4:00pm [ q&a ]', '[ 70mm ]', '10:00pm']])
+
+    assert [(s.title, s.label, s.format) for s in showtimes] == [
+        ('Vertigo', '7:00pm', '35mm'),
+        ('Vertigo', '9:30pm', 'DCP'),
+        ('Alien', '1:00pm', '70mm'),
+        ('Alien', '4:00pm', '70mm, q&a'),
+        ('Alien', '10:00pm', '')]
+
+    assert list(showtimes.iter_groups()) == [
+        ('Vertigo', '35mm', ['7:00pm']),
+        ('Vertigo', 'DCP', ['9:30pm']),
+        ('Alien', '70mm', ['1:00pm']),
+        ('Alien', '70mm, q&a', ['4:00pm']),
+        ('Alien', '', ['10:00pm'])]
+
+
+def test_from_lists_titles_only():
+    showtimes = Showtimes.from_lists(['Vertigo', 'Alien'], ['', ''])
+
+    assert [(s.title, s.start, s.label) for s in showtimes] == [
+        ('Vertigo', NO_TIME, ''), ('Alien', NO_TIME, '')]
+    assert list(showtimes.iter_groups()) == [('Vertigo', '', []), ('Alien', '', [])]
+
+
+def test_iter_groups_skips_sold_out():
+    showtimes = Showtimes()
+    showtimes.append('Vertigo', 19 * 60, sold_out=True)
+    showtimes.append('Vertigo', 21 * 60 + 30)
+    showtimes.append('Alien', 20 * 60, sold_out=True)
+
+    assert list(showtimes.iter_groups()) == [('Vertigo', '', ['9:30pm'])]
+    assert list(showtimes.iter_groups(sold_out=True))[-1] == ('Alien', '', ['8:00pm'])
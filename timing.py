@@ -0,0 +1,110 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+import json
+import sys
+import threading
+import time
+
+
+STAGES = ('fetch', 'parse', 'filter_past', 'filter_movies', 'combine_times', # (within scrape)
+          'scrape', 'ratings', 'postprocess', 'render')
+
+ENABLED = False
+
+_THEATER = ContextVar('theater', default=None)
+_TIMES = defaultdict(lambda: [0, 0.]) # (theater, stage) -> [count, seconds]
+_LOCK = threading.Lock()
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+
+
+@contextmanager
+def for_theater(theater):
+    """Attribute stages within this context (& thread) to `theater`"""
+    token = _THEATER.set(theater)
+    try:
+        yield
+    finally:
+        _THEATER.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """Time stage (if profiling)
+
+    :name: str
+    """
+    if not ENABLED:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _LOCK:
+            times = _TIMES[(_THEATER.get(), name)]
+            times[0] += 1
+            times[1] += elapsed
+
+
+def timed(name):
+    """Decorator: time each call as stage `name` (if profiling)"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_report():
+    """Get per-theater times per stage
+
+    :returns: dict {theater: {stage: {'n': int, 'seconds': float}}}
+    """
+    d_report = defaultdict(dict)
+    with _LOCK:
+        for (theater, name), (n, seconds) in _TIMES.items():
+            d_report[theater or '(run)'][name] = dict(n=n, seconds=seconds)
+    return dict(d_report)
+
+
+def print_report(file=sys.stderr):
+    """Print summary table (slowest theaters first)"""
+    d_report = get_report()
+    stages = [name for name in STAGES if any(name in d for d in d_report.values())]
+
+    get_ms = lambda d, name: d.get(name, {}).get('seconds', 0) * 1e3
+    total = lambda d: sum(get_ms(d, name) for name in ('scrape', 'ratings', 'postprocess', 'render'))
+
+    col_space = max(map(len, d_report), default=0)
+    print(f'\n{"":{col_space}}  ' + ''.join(f'{name:>14}' for name in stages) +
+          f'{"total (ms)":>14}', file=file)
+
+    for theater, d in sorted(d_report.items(), key=lambda kv: -total(kv[1])):
+        print(f'{theater:{col_space}}  ' +
+              ''.join(f'{get_ms(d, name):14.1f}' for name in stages) +
+              f'{total(d):14.1f}', file=file)
+
+    totals = {name: {'seconds': sum(d.get(name, {}).get('seconds', 0)
+                                    for d in d_report.values())} for name in stages}
+    print(f'{"(all)":{col_space}}  ' +
+          ''.join(f'{get_ms(totals, name):14.1f}' for name in stages) +
+          f'{total(totals):14.1f}', file=file)
+
+
+def write_report(path):
+    """Write per-theater times per stage as json
+
+    :path: str
+    """
+    with open(path, 'w') as f:
+        json.dump(get_report(), f, indent=2, sort_keys=True)
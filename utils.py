@@ -1,27 +1,162 @@
-from datetime import datetime
+from datetime import date as date_, datetime, timedelta
+from functools import lru_cache
 from itertools import chain
 from operator import itemgetter
 import os
 import re
 
-from dateutil import parser as dparser
-from more_itertools import groupby_transform
-
 from CLIppy import get_from_file
+from timing import timed
 
 
 DATETIME_SEP = ' @ '
 
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME',
+                                        os.path.expanduser('~/.cache')), 'cinematic')
+
 error_str   = '[ {} ]'
 # xed_out_str = '\e[9m{}\e[0m'
 
 
+PATTERN_JUNK = re.compile('(^.*[0-9] *((p|a)m)?).*$', re.I)
+PATTERN_AMPM = re.compile(' *((a|p)m)')
+PATTERN_DATE = re.compile('^ *([0-9]{4})-([0-9]{1,2})-([0-9]{1,2}) *$')                 # yyyy-mm-dd
+PATTERN_TIME = re.compile(r'^ *([0-9]{1,2})(?::([0-9]{2}))? *(?:([ap])\.?m\.?)? *$', re.I) # hh:mm {a,p}m
+
+_CUTOFF = None # (see `set_cutoff`)
+_TODAY = None  # (see `set_today`)
+
+
 def clean_time(t):
-    PATTERN = re.compile('(^.*[0-9] *((p|a)m)?).*$', re.I)
-    return re.sub(PATTERN, r'\1', t) # ignore any junk after "{a,p}m"
-                                     # (but don't assume present)
+    return re.sub(PATTERN_JUNK, r'\1', t) # ignore any junk after "{a,p}m"
+                                          # (but don't assume present)
+
+
+@lru_cache(maxsize=4096)
+def _parse_datetime(dt, today, sep=DATETIME_SEP):
+    date, time = dt.split(sep)
+    time = clean_time(time)
+
+    m_date, m_time = PATTERN_DATE.match(date), PATTERN_TIME.match(time)
+
+    if not (m_date and m_time): # fall back to (slow) general parser
+        return parse_date(', '.join((date, time)), today)
+
+    year, month, day = (int(x) for x in m_date.groups())
+    hour, minute, ampm = m_time.groups()
+    hour, minute = int(hour), int(minute or 0)
+
+    if ampm is not None:
+        hour = hour % 12 + (12 if ampm.lower() == 'p' else 0)
+
+    return datetime(year, month, day, hour, minute)
+
+
+def parse_datetime(dt, sep=DATETIME_SEP):
+    """Parse showtime (memoized)
+
+    :dt: str ("date @ time")
+    :returns: datetime
+    """
+    return _parse_datetime(dt, get_today(), sep=sep) # partial dates are relative to today
+
+
+@lru_cache(maxsize=1024)
+def _parse_day(day, today):
+    return parse_date(day, today)
+
+
+def parse_day(day):
+    """Parse day label (memoized)
+
+    :day: str
+    :returns: datetime
+    """
+    return _parse_day(day, get_today())
+
+
+def parse_date(text, today=None):
+    """Parse (partial) date or datetime, e.g. day label w/o year
+
+    :text: str
+    :today: datetime.date, that partial dates are relative to (default: `get_today`)
+    :returns: datetime
+    """
+    from dateutil import parser as dparser # (only imported once needed)
+
+    today = today if today is not None else get_today()
+    return dparser.parse(text, default=datetime(today.year, today.month, today.day))
+
+
+def convert_date(date, fmt_out='%Y-%m-%d'):
+    """Convert (partial) date, or "today" / "tomorrow", relative to `get_today`
+    (cf. `CLIppy.convert_date`, relative to the wall clock)
+
+    :date: str
+    :fmt_out: str
+    :returns: str
+    """
+    today = get_today()
+    days = dict(today=0, tomorrow=1, tom=1).get(date.lower())
+
+    return ((datetime(today.year, today.month, today.day) + timedelta(days=days)
+             if days is not None else parse_date(date, today)).strftime(fmt_out))
+
+
+def set_today(today=None):
+    """Fix reference date for partial dates & day labels, e.g. as of recording fixtures
+
+    :today: date (or datetime) str (default: unfix, i.e. actual today)
+    """
+    global _TODAY
+    _TODAY = datetime.fromisoformat(today).date() if today is not None else None
+
+
+def get_today():
+    """Get reference date for partial dates & day labels
+
+    :returns: datetime.date
+    """
+    return _TODAY if _TODAY is not None else date_.today()
+
+
+@lru_cache(maxsize=4096)
+def format_time(dt, sep=DATETIME_SEP):
+    """date @ time -> time
+
+    :dt: str ("date @ time")
+    :returns: str (e.g. "7:00pm")
+    """
+    return re.sub(PATTERN_AMPM, r'\1', # rm space before {a,p}m
+                  dt.split(sep)[-1].strip().lower())
+
+
+def set_cutoff(cutoff=None):
+    """Fix cutoff for past showtimes for the rest of this run
+
+    :cutoff: datetime str (default: now)
+    """
+    global _CUTOFF
+    if cutoff is None:
+        _CUTOFF = datetime.now()
+    else:
+        from dateutil import parser as dparser # (only imported once needed)
+        _CUTOFF = dparser.parse(cutoff)
+
+
+def get_cutoff(cutoff=None):
+    """Get cutoff for past showtimes
+
+    :cutoff: datetime str (default: run cutoff, else now)
+    :returns: datetime
+    """
+    if cutoff is not None:
+        from dateutil import parser as dparser # (only imported once needed)
+        return dparser.parse(cutoff)
+    return _CUTOFF if _CUTOFF is not None else datetime.now()
 
 
+@timed('filter_movies')
 def filter_movies(movie_names, movie_times):
     """Filter movies that have no corresponding times
 
@@ -40,40 +175,30 @@ def filter_movies(movie_names, movie_times):
     return list(movie_names), list(movie_times)
 
 
+@timed('filter_past')
 def filter_past(datetimes, cutoff=None, sep=DATETIME_SEP):
     """Filter datetimes before cutoff
 
     :datetimes: list of strs ("date @ time") OR list of lists of strs
-    :cutoff: datetime str (default: now)
+    :cutoff: datetime str (default: run cutoff, else now)
     :returns: list of lists of (time) strs (or emptylist if past)
     """
-    cutoff = datetime.now() if cutoff is None else dparser.parse(cutoff)
+    cutoff = get_cutoff(cutoff)
 
     if not datetimes:
         return []
 
-    def clean_datetime(dt, sep=sep):
-        date, time = dt.split(sep)
-        return ', '.join((date, clean_time(time)))
-
-    is_past = lambda dt: (
-        dparser.parse(clean_datetime(dt))
-        - cutoff
-    ).total_seconds() < 0
-
-    # date @ time -> time
-    PATTERN = re.compile(' *((a|p)m)')
-    strftime = lambda dt: re.sub(PATTERN, r'\1', # rm space before {a,p}m
-                                 dt.split(DATETIME_SEP)[-1].strip().lower())
+    is_past = lambda dt: parse_datetime(dt, sep=sep) < cutoff
 
     is_nested_list = isinstance(datetimes[0], list)
 
-    return ([[strftime(dt) for dt in dts if not is_past(dt)]
+    return ([[format_time(dt, sep=sep) for dt in dts if not is_past(dt)]
              for dts in datetimes] if is_nested_list else
-           [[strftime(dt)] # list of lists of "times"
+           [[format_time(dt, sep=sep)] # list of lists of "times"
             if not is_past(dt) else [] for dt in datetimes])
 
 
+@timed('combine_times')
 def combine_times(movie_names, movie_times):
     """Combine times for duplicate movienames
 
@@ -86,6 +211,7 @@ def combine_times(movie_names, movie_times):
     if not movie_names:
         return [], []
 
+    from more_itertools import groupby_transform # (only imported once needed)
     movie_names, movie_times = zip(
         *[(k, list(chain.from_iterable(g))) for k,g in groupby_transform(
             sorted(zip(movie_names, movie_times)), itemgetter(0),   # group by name
@@ -94,25 +220,32 @@ def combine_times(movie_names, movie_times):
     return list(movie_names), list(movie_times)
 
 
-def filter_by_rating(movie_names, movie_times, movie_ratings, threshold=0):
+def filter_by_rating(showtimes, d_ratings, threshold=0):
     """Filter movies by minimum rating
 
-    :movie_names: [strs]
-    :movie_times: [[strs]]
-    :movie_ratings: [floats]
+    :showtimes: Showtimes
+    :d_ratings: dict {title: float} (or None, if not rated)
     :threshold: float [0, 1] or % (1, 100]
-    :returns: tuple(movie names, movie times, movie ratings)
+    :returns: Showtimes
     """
     threshold = threshold / 100 if threshold > 1 else threshold # % -> float
 
-    tuple_in = (movie_names, movie_times, movie_ratings)
-    tuple_out = (zip(*((name, time, rating) for name, time, rating in zip(*tuple_in)
-                       if rating >= threshold or rating < 0)) # only if above threshold or rating not found
-                 if threshold > 0 else tuple_in) # else, don't bother to filter
-    tuple_out = tuple(tuple_out)
-    tuple_out = (tuple_out if tuple_out else ((), (), ())) # don't return empty tuple if all filtered out
+    if threshold <= 0 or d_ratings is None: # don't bother to filter
+        return showtimes
 
-    return tuple_out
+    return showtimes.select({title for title in showtimes.unique_titles()
+                             if d_ratings.get(title, -1) >= threshold
+                             or d_ratings.get(title, -1) < 0}) # only if above threshold or rating not found
+
+
+def get_cities():
+    """Get all cities w/ theater lists
+
+    :returns: list of cities (str)
+    """
+    dirname = os.path.dirname(os.path.realpath(__file__))
+    return sorted(f.split('_', 1)[-1] for f in os.listdir(dirname)
+                  if f.startswith('theaters_'))
 
 
 def get_theaters(city):
@@ -125,6 +258,18 @@ def get_theaters(city):
     return get_from_file(suffix=city, prefix='theaters', dirname=dirname)
 
 
+def get_dates(date, n=1):
+    """Get consecutive dates, starting from `date`
+
+    :date: str (yyyy-mm-dd)
+    :n: number of days
+    :returns: list of strs (yyyy-mm-dd)
+    """
+    FMT = '%Y-%m-%d'
+    day0 = datetime.strptime(date, FMT)
+    return [(day0 + timedelta(days=i)).strftime(FMT) for i in range(n)]
+
+
 def index_into_days(days, date=None):
     """Get index into list of days that matches given `date`
 
@@ -132,24 +277,30 @@ def index_into_days(days, date=None):
     :date: str (generally yyyy-mm-dd)
     :returns: int
     """
-    date = dparser.parse(date) if date is not None else datetime.now()
+    date = parse_day(date) if date is not None else parse_day(get_today().isoformat())
 
     # get offset from day0 (which is prob today, but not sure about cutoff for today vs tomorrow)
     # this way, works for a list that says only: "wed, thu, fri, sat, sun, mon, tue, wed"
-    iday = (date - dparser.parse(days[0])).days
-    assert 0 <= iday <= len(days) - 1, '{} !<= {} !<= {}'.format(0, iday, len(days) - 1)
+    iday = (date - parse_day(days[0])).days
+    if not 0 <= iday <= len(days) - 1:
+        raise(DateNotListed('{} !<= {} !<= {}'.format(0, iday, len(days) - 1)))
 
     try: # BUT, sometimes will skip a day
-        assert (date - dparser.parse(days[iday])).days % 7 == 0 #, '{} != week multiple of {}'.format(days[iday], date)
+        assert (date - parse_day(days[iday])).days % 7 == 0 #, '{} != week multiple of {}'.format(days[iday], date)
     except(AssertionError):
         # then, fall back to direct indexing
         try:
-            iday = [dparser.parse(day) for day in days].index(date)
+            iday = [parse_day(day) for day in days].index(date)
         except(ValueError): # date not in days
-            raise(AssertionError)
+            raise(DateNotListed(date))
 
     return iday
 
 
 class NoMoviesException(Exception):
     pass
+
+
+class DateNotListed(NoMoviesException, AssertionError):
+    """Source doesn't (yet) list date -- rather than failing"""
+    pass